@@ -0,0 +1,134 @@
+"""
+Measure event-loop lag while URL downloads write to disk.
+
+    python benchmarks/loop_lag.py [downloads] [size_mb] [dir]
+
+Runs `downloads` concurrent downloads of `size_mb` MB each from a local
+server into `dir` (default: a temp dir), once with write() called on the
+event loop, as the download loop used to, and once through FileWriter.
+The server runs on its own thread and loop. A probe task sleeping 10 ms
+records how late the downloads' loop wakes it up: that
+is how long every other handler (progress edits, button presses, other
+users' downloads) would have waited. Each is also run with O_DSYNC, which
+makes every write wait for the disk, as a slow or busy disk does.
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+import threading
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helper.writer import FileWriter  # noqa: E402
+
+CHUNK_SIZE = 256 * 1024
+PROBE_EVERY = 0.01
+PORT = 8799
+
+
+def _serve(size: int):
+    """Serve `size` bytes at /f.bin from a thread with its own event loop."""
+    loop  = asyncio.new_event_loop()
+    ready = threading.Event()
+    block = os.urandom(CHUNK_SIZE)
+
+    async def _file(request):
+        resp = web.StreamResponse(headers={"Content-Length": str(size)})
+        await resp.prepare(request)
+        for _ in range(size // CHUNK_SIZE):
+            await resp.write(block)
+        return resp
+
+    async def _start():
+        app = web.Application()
+        app.router.add_get("/f.bin", _file)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", PORT).start()
+        ready.set()
+
+    loop.create_task(_start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    ready.wait()
+
+
+async def _inline(session: aiohttp.ClientSession, path: str, flags: int):
+    """The download loop before FileWriter: write() on the event loop."""
+    fd = os.open(path, flags, 0o644)
+    try:
+        async with session.get(f"http://127.0.0.1:{PORT}/f.bin") as resp:
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                os.write(fd, chunk)
+    finally:
+        os.close(fd)
+
+
+async def _threaded(session: aiohttp.ClientSession, path: str, flags: int):
+    writer = FileWriter(path, flags)
+    try:
+        async with session.get(f"http://127.0.0.1:{PORT}/f.bin") as resp:
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                await writer.write(chunk)
+    finally:
+        await writer.close()
+
+
+async def _run(download, downloads: int, dest: str, flags: int) -> tuple:
+    lags = []
+    stop = asyncio.Event()
+
+    async def _probe():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(PROBE_EVERY)
+            lags.append(time.perf_counter() - start - PROBE_EVERY)
+
+    probe = asyncio.create_task(_probe())
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(
+            download(session, os.path.join(dest, f"{i}.bin"), flags)
+            for i in range(downloads)
+        ))
+    took = time.perf_counter() - start
+    stop.set()
+    await probe
+    for i in range(downloads):
+        os.remove(os.path.join(dest, f"{i}.bin"))
+    lags.sort()
+    return took, lags[len(lags) // 2], lags[-1]
+
+
+async def _main(downloads: int, dest: str):
+    base = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    for mode, flags in (("buffered", base), ("O_DSYNC", base | os.O_DSYNC)):
+        for label, download in (("write() on the loop", _inline), ("FileWriter", _threaded)):
+            took, median, worst = await _run(download, downloads, dest, flags)
+            print(
+                f"{mode:8} {label:20}: {took:6.2f}s  "
+                f"lag median {median * 1000:6.1f} ms  max {worst * 1000:7.1f} ms"
+            )
+
+
+def main():
+    if len(sys.argv) > 1 and not sys.argv[1].isdigit():
+        sys.exit(__doc__)
+    downloads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    dest = sys.argv[3] if len(sys.argv) > 3 else tempfile.mkdtemp()
+    _serve(size * 1024 * 1024)
+    try:
+        asyncio.run(_main(downloads, dest))
+    finally:
+        if len(sys.argv) <= 3:
+            shutil.rmtree(dest, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
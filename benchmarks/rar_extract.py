@@ -0,0 +1,80 @@
+"""
+Compare RAR extraction engines on one archive.
+
+    python benchmarks/rar_extract.py archive.rar [runs]
+
+The baseline is the old path, rarfile's extractall, which hands the
+archive to one run of its backend tool (unrar, unar or bsdtar). The unrar
+engine runs `unrar x` with an explicit thread count and progress parsing;
+libarchive extracts in-process.
+Engines whose tools are missing are skipped.
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from helper import libarchive_engine, unrar  # noqa: E402
+from helper.extractor import _rar_available  # noqa: E402
+from helper.job import ExtractJob  # noqa: E402
+
+
+def _rarfile(archive_path: str, dest_dir: str):
+    """The RAR branch extract_archive used before the unrar engine."""
+    import rarfile
+    with rarfile.RarFile(archive_path) as rf:
+        rf.extractall(dest_dir)
+
+
+def _unrar(archive_path: str, dest_dir: str):
+    asyncio.run(unrar.run_unrar(
+        archive_path, dest_dir, job=ExtractJob(), threads=Config.EXTRACT_WORKERS,
+    ))
+
+
+def _libarchive(archive_path: str, dest_dir: str):
+    libarchive_engine.extract(archive_path, dest_dir, "rar", job=ExtractJob())
+
+
+def _time(fn, archive_path: str, runs: int) -> float:
+    best = None
+    for _ in range(runs):
+        dest = tempfile.mkdtemp()
+        try:
+            start = time.perf_counter()
+            fn(archive_path, dest)
+            took = time.perf_counter() - start
+        finally:
+            shutil.rmtree(dest, ignore_errors=True)
+        best = took if best is None else min(best, took)
+    return best
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    archive_path = sys.argv[1]
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    engines = [
+        ("rarfile, extractall", _rarfile, _rar_available()),
+        (f"unrar -mt{Config.EXTRACT_WORKERS}", _unrar, unrar.available()),
+        ("libarchive", _libarchive, libarchive_engine.available()),
+    ]
+    baseline = None
+    for label, fn, ok in engines:
+        if not ok:
+            print(f"{label:22}: not installed, skipped")
+            continue
+        took = _time(fn, archive_path, runs)
+        baseline = baseline or took
+        print(f"{label:22}: {took:8.3f}s  ({baseline / took:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Compare the ZIP path-traversal checks on a large archive index.
+
+    python benchmarks/zip_path_check.py [entries]
+
+Builds a ZIP index of `entries` members (default 100 000) spread over
+nested directories, then times the old per-member realpath() check
+against helper.extractor._zip_targets.
+"""
+import io
+import os
+import sys
+import time
+import zipfile
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helper.extractor import _zip_targets  # noqa: E402
+
+
+def _realpath_check(infos: list, dest_dir: str) -> list:
+    """The check _safe_zip_extract used to run for every member."""
+    targets = []
+    for info in infos:
+        target = os.path.realpath(os.path.join(dest_dir, info.filename))
+        if not target.startswith(dest_dir + os.sep):
+            raise RuntimeError(f"Path traversal attempt blocked: {info.filename}")
+        targets.append(target)
+    return targets
+
+
+def _build_index(entries: int) -> list:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for i in range(entries):
+            zf.writestr(f"top{i % 10}/mid{i % 100}/leaf{i % 1000}/file{i}.txt", b"")
+    buf.seek(0)
+    with zipfile.ZipFile(buf) as zf:
+        return zf.infolist()
+
+
+def _time(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"Building an index of {entries} members...")
+    infos = _build_index(entries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dest = os.path.realpath(tmp)
+        # Let realpath() walk real directories, as it does mid-extraction.
+        for info in infos[:1000]:
+            os.makedirs(os.path.join(dest, os.path.dirname(info.filename)), exist_ok=True)
+
+        old = min(_time(_realpath_check, infos, dest) for _ in range(3))
+        new = min(_time(_zip_targets, infos, dest) for _ in range(3))
+
+    print(f"realpath per member   : {old:8.3f}s")
+    print(f"lexical (_zip_targets): {new:8.3f}s")
+    print(f"speedup                : {old / new:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
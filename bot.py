@@ -8,7 +8,7 @@ import logging
 from aiohttp import web
 from pyrogram import Client
 from config import Config
-from utils import temp
+from utils import new_http_session, temp
 
 logging.basicConfig(
     level=logging.INFO,
@@ -66,6 +66,9 @@ async def main():
     # Start web health server
     await start_web()
 
+    # Shared HTTP client for URL downloads
+    temp.HTTP = new_http_session()
+
     # Start user client (for 4 GB uploads)
     user_client = build_user_client()
     if user_client:
@@ -93,7 +96,10 @@ async def main():
             log.warning(f"Could not send startup message to log channel: {e}")
 
     log.info("Bot is running. Press Ctrl+C to stop.")
-    await asyncio.Event().wait()   # Keep alive
+    try:
+        await asyncio.Event().wait()   # Keep alive
+    finally:
+        await temp.HTTP.close()
 
 
 if __name__ == "__main__":
@@ -34,8 +34,53 @@ class Config:
     # ─── Download dir ────────────────────────────────────────────────────────────
     DOWNLOAD_DIR     = "/tmp/unzipbot"
 
+    # ─── Extraction limits ───────────────────────────────────────────────────────
+    EXTRACT_TIMEOUT  = 2 * 60 * 60                    # seconds per extraction job
+    # Uncompressed bytes one job may write, enforced while extracting
+    FREE_EXTRACT_LIMIT    = 10 * 1024 * 1024 * 1024   # 10 GB
+    PREMIUM_EXTRACT_LIMIT = 50 * 1024 * 1024 * 1024   # 50 GB
+    # Output per byte of archive above which a job is treated as a zip bomb
+    MAX_COMPRESSION_RATIO = 200
+    # Archives inside archives (opt-in per user, "Extract Nested Archives")
+    NESTED_MAX_DEPTH = 3                               # levels below the archive sent
+
+    # ─── Streaming uploads ───────────────────────────────────────────────────────
+    # Decompress ZIP members straight into the upload instead of extracting
+    # them under DOWNLOAD_DIR first.
+    STREAM_UPLOADS   = True
+    # Extract .tar / .tar.* archives while they download (files too big for
+    # the in-memory path, and URLs); the archive is never written to disk
+    PIPELINE_TARBALLS = True
+    # List ZIP URLs from their central directory with HTTP Range requests
+    # and fetch only the members picked (servers without ranges: full download)
+    REMOTE_ZIP        = True
+
+    # ─── In-memory fast path ─────────────────────────────────────────────────────
+    # ZIP / tar archives up to this size are downloaded, unpacked and
+    # uploaded from RAM without touching DOWNLOAD_DIR
+    IN_MEMORY_MAX    = 50 * 1024 * 1024    # 50 MB per archive
+    # RAM all in-memory jobs may hold together; past it jobs go to disk
+    IN_MEMORY_TOTAL  = 512 * 1024 * 1024   # 512 MB
+
+    # ─── URL downloads ───────────────────────────────────────────────────────────
+    # Connections per download when the server accepts byte ranges
+    DOWNLOAD_CONNECTIONS = 8
+    # Files smaller than this are fetched over a single connection
+    SEGMENTED_MIN_SIZE   = 16 * 1024 * 1024   # 16 MB
+    # Retries after a network error; downloads resume from a .part file
+    DOWNLOAD_RETRIES     = 3
+    # Shared HTTP client (one pool for every URL job)
+    HTTP_CONNECTIONS          = 100
+    HTTP_CONNECTIONS_PER_HOST = 16    # room for two segmented downloads per host
+    HTTP_DNS_CACHE            = 300   # seconds
+    HTTP_KEEPALIVE            = 30    # seconds an idle connection is kept
+
     # ─── Workers ─────────────────────────────────────────────────────────────────
     MAX_WORKERS      = 500
+    # Processes used to extract large ZIP archives in parallel
+    EXTRACT_WORKERS  = os.cpu_count() or 1
+    # Nested archives extracted at the same time
+    NESTED_WORKERS   = 2
 
     # ─── Sticker ─────────────────────────────────────────────────────────────────
     START_STICKER    = "CAACAgIAAxkBAAEQZtFpgEdROhGouBVFD3e0K-YjmVHwsgACtCMAAphLKUjeub7NKlvk2TgE"
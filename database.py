@@ -28,6 +28,7 @@ class Database:
                 "as_document":     False,
                 "screenshots":     True,
                 "bot_updates":     True,
+                "nested":          False,
                 "banned":          False,
             })
 
@@ -0,0 +1,97 @@
+"""
+Shared asyncio driver for extraction tools that run as subprocesses (7z,
+unrar): feeds their progress output to a parser, and enforces the job's
+cancellation, time limit and output limits while they run.
+"""
+import os
+import time
+import asyncio
+
+from helper.job import ExtractJob
+
+POLL          = 0.5   # seconds between cancellation / timeout checks
+MONITOR_EVERY = 5     # seconds between output-size samples when there is no listing
+
+
+def _du(path: str) -> int:
+    """Bytes in the regular files under path."""
+    total = 0
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    total += _du(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        pass
+    return total
+
+
+async def _kill(proc):
+    try:
+        proc.kill()
+    except ProcessLookupError:
+        pass
+    await proc.wait()
+
+
+async def run_tool(cmd: list, dest_dir: str, job: ExtractJob, parse,
+                   expected_size: int | None = None) -> tuple:
+    """
+    Run `cmd` until it exits and return (returncode, stderr text).
+
+    `parse(buf, job, expected_size)` is given the stdout read so far, reports
+    whatever complete records it finds to the job, and returns the unparsed
+    remainder. `expected_size` (from the archive listing) is checked against
+    the job's output limits before the tool starts; without it the output
+    directory is measured every MONITOR_EVERY seconds instead.
+
+    Raises:
+        JobCancelled: If the job was cancelled (the tool is killed).
+        OutputLimitExceeded: If the output goes over the job's limits.
+        RuntimeError: On timeout.
+    """
+    if expected_size:
+        job.check_output(job.bytes_done + expected_size)
+    monitor = expected_size is None and (
+        job.max_output is not None or job.max_ratio
+    )
+    loop     = asyncio.get_event_loop()
+    baseline = await loop.run_in_executor(None, _du, dest_dir) if monitor else 0
+    sampled  = time.monotonic()
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stderr_task = asyncio.create_task(proc.stderr.read())
+    buf = b""
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(proc.stdout.read(4096), POLL)
+            except asyncio.TimeoutError:
+                chunk = None
+            if chunk == b"":
+                break
+            if chunk:
+                buf = parse(buf + chunk, job, expected_size)
+            job.check()
+            if monitor and time.monotonic() - sampled >= MONITOR_EVERY:
+                written = await loop.run_in_executor(None, _du, dest_dir)
+                job.add(written - baseline)
+                baseline = written
+                sampled  = time.monotonic()
+        if buf:
+            parse(buf + b"\n", job, expected_size)
+        await proc.wait()
+    except BaseException:
+        await _kill(proc)
+        stderr_task.cancel()
+        raise
+
+    stderr = (await stderr_task).decode(errors="replace").strip()
+    return proc.returncode, stderr
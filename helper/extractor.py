@@ -1,17 +1,53 @@
 """
 Archive extraction helper.
-Supports: ZIP, RAR, 7Z, TAR, TAR.GZ, TAR.BZ2, TAR.XZ
+Supports: ZIP, RAR, 7Z, TAR, TAR.GZ, TAR.BZ2, TAR.XZ, TAR.ZST, TAR.LZ4,
+and bare .gz / .bz2 / .xz / .zst / .lz4 streams
 """
 import os
+import bz2
+import gzip
+import lzma
 import zipfile
+import contextlib
 import tarfile
+import stat
 import shutil
 import logging
 import subprocess
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_EXCEPTION
 from pathlib import Path
 
+from config import Config
+from helper import libarchive_engine, unrar
+from helper.formats import COMPRESSIONS, detect_format, format_from_name, split_extension
+from helper.manifest import ArchiveManifest, ManifestEntry
+from helper.job import ExtractJob, JobCancelled, OutputLimitExceeded
+from helper.sevenzip import run_7z
+from helper.utils import safe_join
+from helper.volumes import open_zip, volume_paths
+
 log = logging.getLogger(__name__)
 
+# Below these sizes a process pool costs more than it saves.
+PARALLEL_MIN_MEMBERS = 8
+PARALLEL_MIN_BYTES   = 32 * 1024 * 1024
+
+LIST_TIMEOUT = 300   # seconds; reading an index should never take longer
+COPY_CHUNK   = 1024 * 1024
+
+# Pooled ZIP jobs report progress and see cancellation through per-job
+# slots in shared memory; jobs beyond _SLOTS report per finished group.
+_SLOTS = 16
+
+_pool       = None
+_pool_lock  = threading.Lock()
+_counters   = None   # [bytes, members] per slot, shared with the workers
+_cancelled  = None   # cancel flag per slot
+_free_slots = []
+
 
 def _rar_available() -> bool:
     try:
@@ -28,38 +64,758 @@ def _7z_available() -> bool:
     return shutil.which("7z") is not None
 
 
-def _safe_zip_extract(zf: zipfile.ZipFile, dest_dir: str) -> None:
+def _copy(src, dst, job=None) -> int:
+    """copyfileobj that reports each chunk to the job and honours cancellation."""
+    total = 0
+    while True:
+        chunk = src.read(COPY_CHUNK)
+        if not chunk:
+            break
+        dst.write(chunk)
+        total += len(chunk)
+        if job:
+            job.add(len(chunk))
+            job.check()
+    return total
+
+
+def _is_symlink(info: zipfile.ZipInfo) -> bool:
+    return stat.S_ISLNK(info.external_attr >> 16)
+
+
+def _zip_targets(infos: list, dest_dir: str) -> list:
+    """
+    Map ZipInfos to their paths under dest_dir (a realpath) in one pass,
+    blocking path traversal (zip slip).
+
+    Names are checked lexically by safe_join(); only symlink entries are
+    resolved against the filesystem.
+    """
+    targets = []
+    for info in infos:
+        target = safe_join(dest_dir, info.filename)
+        if _is_symlink(info):
+            real = os.path.realpath(target)
+            if not real.startswith(dest_dir + os.sep):
+                raise RuntimeError(f"Path traversal attempt blocked: {info.filename}")
+        targets.append(target)
+    return targets
+
+
+def _safe_zip_extract(zf: zipfile.ZipFile, dest_dir: str, members=None,
+                      job: ExtractJob | None = None) -> None:
     """Extract ZIP while blocking path traversal (zip slip)."""
     dest_dir = os.path.realpath(dest_dir)
-    for member in zf.infolist():
-        target = os.path.realpath(os.path.join(dest_dir, member.filename))
-        if not target.startswith(dest_dir + os.sep):
-            raise RuntimeError(
-                f"Path traversal attempt blocked: {member.filename}"
+    infos = zf.infolist()
+    if members is not None:
+        wanted = set(members)
+        infos  = [i for i in infos if i.filename in wanted]
+
+    made = set()
+    for member, target in zip(infos, _zip_targets(infos, dest_dir)):
+        if job:
+            job.check()
+        parent = target if member.is_dir() else os.path.dirname(target)
+        if parent not in made:
+            os.makedirs(parent, exist_ok=True)
+            made.add(parent)
+        if member.is_dir():
+            continue
+        with zf.open(member) as src, open(target, "wb") as dst:
+            _copy(src, dst, job)
+        if job:
+            job.add_file(target, member.file_size)
+
+
+def _init_worker(counters, cancelled) -> None:
+    global _counters, _cancelled
+    _counters, _cancelled = counters, cancelled
+
+
+class _SlotJob:
+    """
+    Worker-side stand-in for the ExtractJob, backed by one shared slot.
+    `budget` is what the job could still write when the groups were
+    submitted; all workers of the job count against it together.
+    """
+
+    def __init__(self, slot: int, budget: int | None = None):
+        self.slot   = slot
+        self.budget = budget
+
+    def add(self, nbytes: int = 0, members: int = 0):
+        with _counters.get_lock():
+            _counters[2 * self.slot]     += nbytes
+            _counters[2 * self.slot + 1] += members
+            done = _counters[2 * self.slot]
+        if self.budget is not None and done > self.budget:
+            # The parent reports the limit that tripped.
+            raise OutputLimitExceeded("Output limit reached.")
+
+    def add_file(self, path: str, size: int):
+        # The parent records the paths when the group completes.
+        self.add(members=1)
+
+    def check(self):
+        if _cancelled[self.slot]:
+            raise JobCancelled("Extraction cancelled.")
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Lazily create the process pool shared by all ZIP jobs."""
+    global _pool, _counters, _cancelled, _free_slots
+    with _pool_lock:
+        if _pool is None:
+            # forkserver: never fork the bot process itself, which is
+            # running an event loop and Pyrogram's worker threads.
+            ctx = multiprocessing.get_context("forkserver")
+            _counters   = ctx.Array("q", 2 * _SLOTS)
+            _cancelled  = ctx.Array("b", _SLOTS)
+            _free_slots = list(range(_SLOTS))
+            _pool = ProcessPoolExecutor(
+                max_workers=Config.EXTRACT_WORKERS,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(_counters, _cancelled),
             )
-        zf.extract(member, dest_dir)
+        return _pool
+
+
+def _acquire_slot() -> int | None:
+    with _pool_lock:
+        if not _free_slots:
+            return None
+        slot = _free_slots.pop()
+    with _counters.get_lock():
+        _counters[2 * slot] = _counters[2 * slot + 1] = 0
+    _cancelled[slot] = 0
+    return slot
+
+
+def _release_slot(slot: int) -> None:
+    with _pool_lock:
+        _free_slots.append(slot)
+
+
+def _zip_worker(archive_path: str, dest_dir: str, names: list,
+                slot: int | None = None, budget: int | None = None) -> None:
+    """Process-pool entry point: extract `names` from its own archive handle."""
+    job = _SlotJob(slot, budget) if slot is not None else None
+    with open_zip(archive_path) as zf:
+        _safe_zip_extract(zf, dest_dir, names, job)
+
+
+def _balance_groups(infos: list, n: int) -> list:
+    """Split ZipInfos into at most n groups of roughly equal compressed bytes."""
+    groups = [[] for _ in range(n)]
+    loads  = [0] * n
+    # Largest first, each into the currently lightest group.
+    for info in sorted(infos, key=lambda i: i.compress_size, reverse=True):
+        k = loads.index(min(loads))
+        groups[k].append(info)
+        # A small per-member cost keeps thousands of tiny files from all
+        # landing in one group.
+        loads[k] += info.compress_size + 4096
+    return [g for g in groups if g]
+
+
+def _parallel_zip_extract(archive_path: str, dest_dir: str, members=None,
+                          zf: zipfile.ZipFile | None = None,
+                          job: ExtractJob | None = None) -> None:
+    """
+    Extract a ZIP across the shared process pool.
+
+    Members are split into byte-balanced groups and each worker opens the
+    archive itself. Small archives are extracted in-process instead.
+    `zf` is an already open handle (e.g. a manifest's) to take the index from.
+    Written files are recorded in `job` as each group completes.
+    """
+    own = zf is None
+    if own:
+        zf = open_zip(archive_path)
+    try:
+        infos = zf.infolist()
+        if members is not None:
+            wanted = set(members)
+            infos  = [i for i in infos if i.filename in wanted]
+
+        total   = sum(i.file_size for i in infos)
+        workers = min(Config.EXTRACT_WORKERS, len(infos))
+        if (
+            workers < 2
+            or len(infos) < PARALLEL_MIN_MEMBERS
+            or total < PARALLEL_MIN_BYTES
+        ):
+            _safe_zip_extract(zf, dest_dir, [i.filename for i in infos], job)
+            return
+    finally:
+        if own:
+            zf.close()
+
+    # Validate everything and create the directory skeleton up front, so a
+    # bad member fails the job before any worker starts and workers never
+    # race each other creating the same parent directory.
+    real_dest = os.path.realpath(dest_dir)
+    made = set()
+    for info, target in zip(infos, _zip_targets(infos, real_dest)):
+        parent = target if info.is_dir() else os.path.dirname(target)
+        if parent not in made:
+            os.makedirs(parent, exist_ok=True)
+            made.add(parent)
+
+    job     = job or ExtractJob()
+    pool    = _get_pool()
+    slot    = _acquire_slot()
+    budget  = job.output_budget()
+    groups  = {}
+    for group in _balance_groups(infos, workers):
+        fut = pool.submit(
+            _zip_worker, archive_path, dest_dir, [i.filename for i in group],
+            slot, budget,
+        )
+        groups[fut] = group
+
+    seen    = [0, 0]
+    pending = set(groups)
+
+    def _report(done):
+        for fut in done:
+            if fut.exception() is not None:
+                continue
+            files = [i for i in groups[fut] if not i.is_dir()]
+            job.add_files(
+                (os.path.join(real_dest, i.filename), i.file_size) for i in files
+            )
+            if slot is None:
+                # No live counters: credit each group as it completes.
+                job.add(sum(i.file_size for i in files), len(files))
+        if slot is not None:
+            with _counters.get_lock():
+                now = [_counters[2 * slot], _counters[2 * slot + 1]]
+            job.add(now[0] - seen[0], now[1] - seen[1])
+            seen[:] = now
+
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_EXCEPTION)
+            _report(done)
+            for fut in done:
+                fut.result()
+            job.check()
+    except BaseException:
+        for fut in pending:
+            fut.cancel()
+        if slot is not None:
+            # Stop running groups at their next chunk and wait for them, so
+            # nothing is still writing once the caller cleans up.
+            _cancelled[slot] = 1
+            wait([f for f in groups if not f.cancelled()])
+        raise
+    finally:
+        if slot is not None:
+            _release_slot(slot)
+
+
+def _run_7z(archive_path: str, dest_dir: str, members=None,
+            job: ExtractJob | None = None, expected_size: int | None = None) -> None:
+    """
+    Run the async 7z driver from a worker thread (sync callers only;
+    extract_archive_async awaits it on the bot's own loop instead).
+    """
+    asyncio.run(run_7z(archive_path, dest_dir, members, job, expected_size))
+
+
+def _run_unrar(archive_path: str, dest_dir: str, members=None,
+               job: ExtractJob | None = None, expected_size: int | None = None) -> int:
+    """The unrar counterpart of _run_7z; returns the files unrar reported."""
+    return asyncio.run(unrar.run_unrar(
+        archive_path, dest_dir, members, job, expected_size, Config.EXTRACT_WORKERS,
+    ))
 
 
-def _run_7z(archive_path: str, dest_dir: str) -> None:
-    """Run 7z extraction, raising RuntimeError on failure."""
+def _list_7z(archive_path: str) -> list:
+    """Parse `7z l -slt` into ManifestEntry items for regular files."""
     try:
-        subprocess.run(
-            ["7z", "x", archive_path, f"-o{dest_dir}", "-y"],
+        out = subprocess.run(
+            ["7z", "l", "-slt", "-sccUTF-8", archive_path],
             capture_output=True,
             text=True,
             check=True,
-        )
+            timeout=LIST_TIMEOUT,
+        ).stdout
     except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"7z extraction failed: {e.stderr.strip()}") from e
+        raise RuntimeError(f"7z listing failed: {e.stderr.strip()}") from e
+    except subprocess.TimeoutExpired as e:
+        raise RuntimeError("7z listing timed out.") from e
+
+    # Technical listing: archive properties, a "----------" separator, then
+    # one blank-line separated "Key = Value" block per member.
+    _, _, body = out.partition("\n----------\n")
+    entries = []
+    for block in body.split("\n\n"):
+        props = {}
+        for line in block.splitlines():
+            key, sep, value = line.partition(" = ")
+            if sep:
+                props[key.strip()] = value
+        path = props.get("Path")
+        if not path:
+            continue
+        if props.get("Folder") == "+" or props.get("Attributes", "").startswith("D"):
+            continue
+        packed = props.get("Packed Size")
+        crc    = props.get("CRC")
+        entries.append(ManifestEntry(
+            path,
+            int(props.get("Size") or 0),
+            int(packed) if packed else None,
+            int(crc, 16) if crc else None,
+        ))
+    return entries
+
 
+# Multithreaded decompressors per compression, best first.
+_DECOMPRESSORS = {
+    "gz":  (["pigz", "-dc"],),
+    "bz2": (["lbzip2", "-dc"], ["pbzip2", "-dc"]),
+    "xz":  (["xz", "-dc", "-T0"],),
+    "zst": (["zstd", "-dc", "-T0"],),
+    "lz4": (["lz4", "-dc"],),
+}
 
-def extract_archive(archive_path: str, dest_dir: str) -> list:
+
+def _codec(fmt: str | None) -> str | None:
+    """Compression layer of a format: 'tar.gz' → 'gz', 'zst' → 'zst'."""
+    if not fmt:
+        return None
+    codec = fmt.rpartition(".")[2]
+    return codec if codec in COMPRESSIONS else None
+
+
+def _decompressor(codec: str | None) -> list | None:
+    """Return the command of an installed parallel decompressor for `codec`."""
+    for cmd in _DECOMPRESSORS.get(codec, ()):
+        if shutil.which(cmd[0]):
+            return cmd
+    return None
+
+
+@contextlib.contextmanager
+def py_decompressor(source, codec: str):
+    """
+    Open a compressed stream through Python (used when the command-line
+    tools are missing, and for archives held in memory). `source` is a
+    path or a binary file object. zstd / lz4 need their optional bindings.
+    """
+    try:
+        if codec == "gz":
+            with gzip.open(source, "rb") as reader:
+                yield reader
+        elif codec == "bz2":
+            with bz2.open(source, "rb") as reader:
+                yield reader
+        elif codec == "xz":
+            with lzma.open(source, "rb") as reader:
+                yield reader
+        elif codec == "zst":
+            import zstandard
+            fh = open(source, "rb") if isinstance(source, str) else contextlib.nullcontext(source)
+            with fh as raw:
+                dctx = zstandard.ZstdDecompressor()
+                with dctx.stream_reader(raw, read_across_frames=True, closefd=False) as reader:
+                    yield reader
+        else:
+            import lz4.frame
+            with lz4.frame.open(source, "rb") as reader:
+                yield reader
+    except ImportError as e:
+        tool = "zstd" if codec == "zst" else "lz4"
+        raise RuntimeError(
+            f".{codec} support unavailable. Install the '{tool}' binary "
+            f"or the '{'zstandard' if codec == 'zst' else 'lz4'}' package."
+        ) from e
+
+
+def stream_content_size(archive_path: str, codec: str):
+    """Uncompressed size of a compressed stream, if its framing records it."""
+    try:
+        with open(archive_path, "rb") as fh:
+            if codec == "gz":
+                # ISIZE trailer: size modulo 2**32, exact below 4 GB.
+                if os.path.getsize(archive_path) >= 4 * 1024 ** 3:
+                    return None
+                fh.seek(-4, os.SEEK_END)
+                size = int.from_bytes(fh.read(4), "little")
+            elif codec == "zst":
+                import zstandard
+                size = zstandard.frame_content_size(fh.read(32))
+            elif codec == "lz4":
+                import lz4.frame
+                size = lz4.frame.get_frame_info(fh.read(32)).get("content_size")
+            else:
+                return None
+    except Exception:
+        return None
+    return size if size and size > 0 else None
+
+
+def _stream_member_name(archive_path: str, codec: str) -> str:
+    """Name of the single file inside a bare compressed stream."""
+    name = Path(archive_path).name
+    if name.lower().endswith("." + codec):
+        name = name[:-len(codec) - 1]
+    return name or "file"
+
+
+def _decompress_stream(archive_path: str, dest_dir: str, codec: str,
+                       job: ExtractJob | None = None) -> None:
+    """Decompress a bare (non-tar) compressed file into dest_dir."""
+    out_path = os.path.join(dest_dir, _stream_member_name(archive_path, codec))
+    cmd = _decompressor(codec)
+    if cmd:
+        proc = subprocess.Popen(
+            [*cmd, archive_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        try:
+            with open(out_path, "wb") as out:
+                size = _copy(proc.stdout, out, job)
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            proc.stdout.close()
+        stderr = proc.stderr.read().decode(errors="replace").strip()
+        proc.stderr.close()
+        if proc.wait() != 0:
+            raise RuntimeError(f"{cmd[0]} failed: {stderr}")
+    elif libarchive_engine.available():
+        libarchive_engine.extract(
+            archive_path, dest_dir, codec, job=job,
+            stream_name=os.path.basename(out_path),
+        )
+        return
+    else:
+        with py_decompressor(archive_path, codec) as src, open(out_path, "wb") as out:
+            size = _copy(src, out, job)
+    if job:
+        job.add_file(out_path, size)
+
+
+class _CountingReader:
+    """
+    Pass-through reader under tarfile that reports bytes to the job while
+    `active`; _extract_tar switches it on only while a selected member is
+    being written, so headers and skipped members don't count.
+    """
+
+    def __init__(self, job: ExtractJob):
+        self.job     = job
+        self.active  = False
+        self.raw     = None
+        self.counted = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        if self.active:
+            self.job.add(len(data))
+            self.counted += len(data)
+        return data
+
+    def settle(self, size: int) -> None:
+        """
+        A member of `size` bytes is done. tarfile reads ahead in whole
+        records, so correct the running count to the exact member size.
+        """
+        self.job.add(size - self.counted)
+        self.counted = 0
+
+    def seek(self, *args) -> int:
+        return self.raw.seek(*args)
+
+    def tell(self) -> int:
+        return self.raw.tell()
+
+
+def _feed(source, stdin, errors: list) -> None:
+    """Copy a file object into a tool's stdin (feeder thread of _tool_reader)."""
+    try:
+        while True:
+            data = source.read(COPY_CHUNK)
+            if not data:
+                break
+            stdin.write(data)
+    except BrokenPipeError:
+        pass   # the tool exited (failed, or was killed once we stopped reading)
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+@contextlib.contextmanager
+def _tool_reader(cmd: list, source):
+    """
+    Run the decompressor `cmd` over `source` and yield its output. A path
+    is handed to the tool; a file object, which need not be seekable
+    (helper.pipeline.ChunkPipe), is fed to its stdin from a thread.
+
+    The exit status is only judged if the output was read to the end;
+    stopping early (all selected members found) kills the tool. An error
+    reading `source` is raised in place of what it caused downstream.
+    """
+    feed   = not isinstance(source, str)
+    errors = []
+    proc   = subprocess.Popen(
+        cmd if feed else [*cmd, source],
+        stdin=subprocess.PIPE if feed else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    if feed:
+        threading.Thread(
+            target=_feed, args=(source, proc.stdin, errors),
+            name="decompress-feed", daemon=True,
+        ).start()
+    try:
+        yield proc.stdout
+        drained = proc.stdout.read(1) == b""
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        if errors:
+            raise errors[0]
+        raise
+    finally:
+        proc.stdout.close()
+
+    if not drained:
+        proc.kill()
+        proc.wait()
+        return
+    stderr = proc.stderr.read().decode(errors="replace").strip()
+    proc.stderr.close()
+    if proc.wait() != 0:
+        if errors:
+            raise errors[0]
+        raise RuntimeError(f"{cmd[0]} failed: {stderr}")
+
+
+@contextlib.contextmanager
+def _open_tar(archive_path: str, fmt: str, counter: _CountingReader | None = None):
+    """
+    Open a tarball for a single forward pass.
+
+    When a parallel decompressor is installed the archive is piped through
+    it; otherwise Python decompresses it on one core (zstd / lz4 through
+    their Python bindings). Compressed tarballs are read in tarfile stream
+    mode (r|). `counter`, if given, is placed between tarfile and the data.
+    """
+    codec = _codec(fmt)
+    cmd   = _decompressor(codec)
+
+    def _wrap(raw):
+        if counter is None:
+            return raw
+        counter.raw = raw
+        return counter
+
+    if cmd is None:
+        if codec is None:
+            with open(archive_path, "rb") as raw:
+                with tarfile.open(fileobj=_wrap(raw), mode="r:") as tf:
+                    yield tf
+            return
+        with py_decompressor(archive_path, codec) as reader:
+            with tarfile.open(fileobj=_wrap(reader), mode="r|") as tf:
+                yield tf
+        return
+
+    with _tool_reader(cmd, archive_path) as out:
+        with tarfile.open(fileobj=_wrap(out), mode="r|") as tf:
+            yield tf
+
+
+def _extract_tar(tf: tarfile.TarFile, dest_dir: str, members=None,
+                 job: ExtractJob | None = None,
+                 counter: _CountingReader | None = None) -> None:
+    """Extract from an open tarfile (either mode) with the 'data' filter."""
+    wanted = set(members) if members is not None else None
+
+    def _emit(m):
+        # extractall writes each member before asking for the next one.
+        if counter:
+            counter.active = True
+        yield m
+        if counter:
+            counter.active = False
+            counter.settle(m.size if m.isfile() else 0)
+        if job and m.isfile():
+            # The 'data' filter strips leading slashes the same way.
+            job.add_file(os.path.join(dest_dir, m.name.lstrip("/")), m.size)
+
+    def _selected():
+        for m in tf:
+            if job:
+                job.check()
+            if wanted is None:
+                yield from _emit(m)
+            elif m.name in wanted:
+                wanted.discard(m.name)
+                yield from _emit(m)
+                if not wanted:
+                    return   # don't read the rest of the archive
+
+    tf.extractall(dest_dir, members=_selected(), filter="data")
+
+
+def archive_format(archive_path: str) -> str | None:
+    """
+    detect_format(), plus "other" for anything else libarchive can read
+    (ISO 9660, cpio, ar, ...) when the engine is installed.
+    """
+    fmt = detect_format(archive_path)
+    if fmt is None and libarchive_engine.identify(archive_path):
+        fmt = "other"
+    return fmt
+
+
+def extract_tar_stream(source, dest_dir: str, fmt: str,
+                       job: ExtractJob | None = None) -> list:
+    """
+    Extract every member of a tarball read front to back from `source`, a
+    file object that need not be seekable (e.g. helper.pipeline.ChunkPipe).
+    Compressed tarballs are piped through the parallel decompressor if one
+    is installed, else decompressed in Python on the way.
+    Returns the extracted paths in the order they were written.
+    """
+    dest_dir = os.path.abspath(dest_dir)
+    os.makedirs(dest_dir, exist_ok=True)
+    job     = job or ExtractJob()
+    counter = _CountingReader(job)
+    codec   = _codec(fmt)
+    cmd     = _decompressor(codec)
+    if cmd:
+        opened = _tool_reader(cmd, source)
+    elif codec:
+        opened = py_decompressor(source, codec)
+    else:
+        opened = contextlib.nullcontext(source)
+    with opened as reader:
+        counter.raw = reader
+        with tarfile.open(fileobj=counter, mode="r|") as tf:
+            _extract_tar(tf, dest_dir, None, job, counter)
+    return job.paths
+
+
+def _resolve_format(archive_path: str, fmt: str | None) -> str:
+    """Return fmt, sniffing the file once if the caller did not pass it."""
+    fmt = fmt or archive_format(archive_path)
+    if fmt is None:
+        raise RuntimeError(
+            f"Unsupported archive format: {os.path.basename(archive_path)}"
+        )
+    return fmt
+
+
+def list_archive(archive_path: str, fmt: str | None = None) -> ArchiveManifest | None:
+    """
+    Read only the archive index (ZIP central directory, tar headers,
+    libarchive, RAR headers or `7z l -slt`) without writing anything to disk.
+
+    `fmt` is the format from archive_format(); it is sniffed here if omitted.
+
+    Returns an ArchiveManifest of the regular files in archive order, or
+    None when the format cannot be listed with the tools installed and the
+    caller should fall back to a full extraction.
+
+    Raises:
+        FileNotFoundError: If archive_path does not exist.
+        RuntimeError: If the format is unsupported or the index cannot be read.
+    """
+    archive_path = os.path.abspath(archive_path)
+    if not os.path.isfile(archive_path):
+        raise FileNotFoundError(
+            f"Archive not found: {archive_path}"
+        )
+
+    fmt = _resolve_format(archive_path, fmt)
+
+    try:
+        if fmt == "zip":
+            # Kept open in the manifest for extraction and streaming.
+            zf = open_zip(archive_path)
+            entries = [
+                ManifestEntry(i.filename, i.file_size, i.compress_size, i.CRC)
+                for i in zf.infolist() if not i.is_dir()
+            ]
+            return ArchiveManifest(archive_path, fmt, entries, zip_file=zf)
+
+        if fmt == "tar" or fmt.startswith("tar."):
+            with _open_tar(archive_path, fmt) as tf:
+                entries = [ManifestEntry(m.name, m.size) for m in tf if m.isfile()]
+            return ArchiveManifest(archive_path, fmt, entries)
+
+        if fmt in ("rar", "7z", "other") and libarchive_engine.handles(archive_path):
+            entries = libarchive_engine.list_entries(archive_path, fmt)
+            return ArchiveManifest(archive_path, fmt, entries)
+
+        if fmt == "rar" and _rar_available():
+            import rarfile
+            with rarfile.RarFile(archive_path) as rf:
+                entries = [
+                    ManifestEntry(i.filename, i.file_size, i.compress_size, i.CRC)
+                    for i in rf.infolist() if not i.is_dir()
+                ]
+            return ArchiveManifest(archive_path, fmt, entries)
+
+        if fmt in ("rar", "7z") and _7z_available():
+            return ArchiveManifest(archive_path, fmt, _list_7z(archive_path))
+
+        if fmt in COMPRESSIONS:
+            # Bare stream: exactly one member.
+            entries = [ManifestEntry(
+                _stream_member_name(archive_path, fmt),
+                stream_content_size(archive_path, fmt) or 0,
+                os.path.getsize(archive_path),
+            )]
+            return ArchiveManifest(archive_path, fmt, entries)
+
+    except (FileNotFoundError, RuntimeError):
+        raise
+    except Exception as e:
+        log.exception("Listing failed for '%s': %s", archive_path, e)
+        raise RuntimeError(f"Could not read archive: {e}") from e
+
+    return None
+
+
+def extract_archive(archive_path: str, dest_dir: str, members=None,
+                    fmt: str | None = None,
+                    manifest: ArchiveManifest | None = None,
+                    job: ExtractJob | None = None,
+                    nested_depth: int = 0) -> list:
     """
     Extract archive_path into dest_dir.
-    Returns sorted list of extracted absolute file paths.
+    Returns the extracted absolute file paths in the order they were written.
+
+    If members is given (names as returned by list_archive), only those
+    entries are extracted and only their paths are returned. `fmt` is the
+    format from archive_format(); it is sniffed here if omitted. Passing the
+    manifest from list_archive supplies the format and, for ZIP, reuses its
+    already-parsed index. `job` carries cancellation and limits, and
+    collects progress and the written (path, size) pairs as they happen.
+    With nested_depth > 0, archives found among the extracted files are
+    unpacked in their place, up to that many levels deep.
 
     Raises:
         FileNotFoundError: If archive_path does not exist.
+        JobCancelled: If the job was cancelled.
+        OutputLimitExceeded: If the output goes over the job's byte budget
+            or compression ratio.
         RuntimeError: If the format is unsupported or extraction fails.
     """
     archive_path = os.path.abspath(archive_path)
@@ -71,64 +827,84 @@ def extract_archive(archive_path: str, dest_dir: str) -> list:
             f"Archive not found: {archive_path}"
         )
 
+    if manifest is not None:
+        fmt = manifest.fmt
+    fmt = _resolve_format(archive_path, fmt)
     os.makedirs(dest_dir, exist_ok=True)
-
-    # Derive extension from the filename only, not the full path.
-    name = Path(archive_path).name.lower()
+    job = job or ExtractJob()
+    if job.input_size is None:
+        job.input_size = _input_size(archive_path)
 
     try:
-        if name.endswith(".zip"):
-            with zipfile.ZipFile(archive_path, "r") as zf:
-                _safe_zip_extract(zf, dest_dir)
+        if fmt == "zip":
+            _parallel_zip_extract(
+                archive_path, dest_dir, members,
+                zf=manifest.zip_file() if manifest is not None else None,
+                job=job,
+            )
+
+        elif fmt == "tar" or fmt.startswith("tar."):
+            counter = _CountingReader(job) if job else None
+            with _open_tar(archive_path, fmt, counter) as tf:
+                _extract_tar(tf, dest_dir, members, job, counter)
 
-        elif any(name.endswith(e) for e in
-                 (".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".tar")):
-            with tarfile.open(archive_path) as tf:
-                tf.extractall(dest_dir, filter="data")
+        elif fmt == "rar" and unrar.available():
+            counted = _run_unrar(archive_path, dest_dir, members, job)
+            _record_extracted(job, dest_dir, members, manifest, counted)
 
-        elif name.endswith(".rar"):
+        elif fmt in ("rar", "7z", "other") and libarchive_engine.handles(archive_path):
+            libarchive_engine.extract(archive_path, dest_dir, fmt, members, job)
+
+        elif fmt == "rar":
             if _rar_available():
                 import rarfile
                 with rarfile.RarFile(archive_path) as rf:
-                    rf.extractall(dest_dir)
+                    wanted = set(members) if members is not None else None
+                    infos  = [
+                        i for i in rf.infolist()
+                        if wanted is None or i.filename in wanted
+                    ]
+                    total = sum(i.file_size for i in infos)
+                    # One backend run for all members (per member, a solid
+                    # archive is decompressed again up to each one), so the
+                    # limits are checked against the listed sizes up front.
+                    job.check()
+                    job.check_output(job.bytes_done + total)
+                    rf.extractall(dest_dir, members=infos)
+                job.add(total)
+                files = [
+                    (os.path.join(dest_dir, i.filename), i.file_size)
+                    for i in infos if not i.is_dir()
+                ]
+                job.add_files(files)
+                job.add(members=len(files))
             elif _7z_available():
-                _run_7z(archive_path, dest_dir)
+                _run_7z(archive_path, dest_dir, members, job)
+                _record_extracted(job, dest_dir, members, manifest)
             else:
                 raise RuntimeError(
-                    "RAR support unavailable. "
-                    "Install 'rarfile' + unrar/bsdtar, or p7zip-full."
+                    "RAR support unavailable. Install libarchive-c, "
+                    "'rarfile' + unrar/bsdtar, or p7zip-full."
                 )
 
-        elif name.endswith(".7z"):
+        elif fmt == "7z":
             if _7z_available():
-                _run_7z(archive_path, dest_dir)
+                _run_7z(archive_path, dest_dir, members, job)
+                _record_extracted(job, dest_dir, members, manifest)
             else:
                 raise RuntimeError(
-                    "7z binary not found. Install p7zip-full."
+                    "7z support unavailable. Install libarchive-c or p7zip-full."
                 )
 
-        elif any(name.endswith(e) for e in (".gz", ".bz2", ".xz")):
-            # Bare compressed files (not tar). Decompress with 7z if available.
-            if _7z_available():
-                _run_7z(archive_path, dest_dir)
-            else:
-                raise RuntimeError(
-                    f"Unsupported compressed format '{name}'. "
-                    "Install p7zip-full for .gz/.bz2/.xz support."
-                )
+        elif fmt == "other":
+            raise RuntimeError("This archive format needs libarchive-c.")
 
         else:
-            # Unknown extension — attempt 7z as a last resort.
-            if _7z_available():
-                log.warning(
-                    "Unrecognised extension for '%s', attempting 7z fallback.",
-                    name,
-                )
-                _run_7z(archive_path, dest_dir)
-            else:
-                raise RuntimeError(
-                    f"Unsupported archive format: {archive_path}"
-                )
+            # Bare compressed file (not tar).
+            _decompress_stream(archive_path, dest_dir, fmt, job)
+
+        if nested_depth:
+            _extract_nested(job, nested_depth)
 
     except (FileNotFoundError, RuntimeError):
         raise
@@ -136,20 +912,179 @@ def extract_archive(archive_path: str, dest_dir: str) -> list:
         log.exception("Extraction failed for '%s': %s", archive_path, e)
         raise RuntimeError(f"Extraction failed: {e}") from e
 
-    extracted = [
-        str(p)
-        for p in sorted(Path(dest_dir).rglob("*"))
-        if p.is_file()
-    ]
-    return extracted
+    return job.paths
 
 
-def is_archive(filename: str) -> bool:
-    """Return True if filename has a recognised archive extension."""
-    exts = (
-        ".zip", ".rar", ".7z",
-        ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz",
-        ".gz", ".bz2", ".xz",
+def _input_size(archive_path: str) -> int:
+    """On-disk size of an archive, all parts of a split set included."""
+    return sum(os.path.getsize(p) for p in volume_paths(archive_path))
+
+
+def _record_extracted(job: ExtractJob, dest_dir: str, members=None,
+                      manifest: ArchiveManifest | None = None, counted: int = 0) -> None:
+    """
+    Record what a finished 7z / unrar run wrote. Both extract exactly the
+    listed members, so the manifest says which; only without one is the
+    tree scanned. `counted` members were already reported while it ran.
+    """
+    if manifest is not None:
+        wanted = set(members) if members is not None else None
+        files  = [
+            (os.path.join(dest_dir, e.name), e.size)
+            for e in manifest.entries if wanted is None or e.name in wanted
+        ]
+    else:
+        if members is not None:
+            paths = [os.path.join(dest_dir, m) for m in members]
+        else:
+            paths = [str(p) for p in Path(dest_dir).rglob("*")]
+        files = [(p, os.path.getsize(p)) for p in paths if os.path.isfile(p)]
+    job.add_files(files)
+    job.add(members=len(files) - counted)
+
+
+def _nested_dir(path: str) -> str:
+    """
+    Create and return a fresh directory next to a nested archive, named
+    after it minus the extension ("a.zip" → "a", then "a (1)", ...).
+    """
+    stem, ext = split_extension(path)
+    base = stem if ext and os.path.basename(stem) else path + "_files"
+    target, n = base, 1
+    while True:
+        try:
+            os.makedirs(target)
+            return target
+        except FileExistsError:
+            target = f"{base} ({n})"
+            n += 1
+
+
+def _extract_inner(path: str, job: ExtractJob) -> list:
+    """
+    Unpack one nested archive in place of itself and return the new paths.
+    Anything that can't be unpacked (corrupt, encrypted, not really an
+    archive, over the output limit) stays a plain file and returns [].
+    """
+    manifest = None
+    out_dir  = None
+    sub      = job.child()
+    try:
+        fmt = archive_format(path)
+        if fmt is None:
+            return []
+        manifest = list_archive(path, fmt)
+        if manifest is not None and sub.max_output is not None \
+                and manifest.total_size > sub.max_output:
+            log.info("Nested archive '%s' is over the output limit, kept as is.", path)
+            return []
+        out_dir = _nested_dir(path)
+        extract_archive(path, out_dir, fmt=fmt, manifest=manifest, job=sub)
+    except Exception as e:
+        job.check()   # cancellation and timeouts still end the whole job
+        log.info("Nested archive '%s' kept as is: %s", path, e)
+        if out_dir:
+            shutil.rmtree(out_dir, ignore_errors=True)
+        job.discard(sub)
+        return []
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    os.remove(path)
+    job.adopt(sub, path)
+    return sub.paths
+
+
+def _extract_nested(job: ExtractJob, max_depth: int) -> None:
+    """
+    Replace archives among job.files with their contents, one level at a
+    time down to max_depth, Config.NESTED_WORKERS archives at once.
+    Candidates are picked by extension and confirmed by their magic bytes.
+    """
+    job.percent = None   # any engine percentage was for the outer archive
+    level = job.paths
+    with ThreadPoolExecutor(max_workers=Config.NESTED_WORKERS) as pool:
+        for _ in range(max_depth):
+            candidates = [p for p in level if format_from_name(p)]
+            if not candidates:
+                return
+            job.check()
+            level = [
+                p
+                for paths in pool.map(lambda p: _extract_inner(p, job), candidates)
+                for p in paths
+            ]
+
+
+def subprocess_tool(fmt: str, archive_path: str) -> str | None:
+    """
+    "unrar" or "7z" if extract_archive would hand this archive to that
+    binary, None if it is extracted in-process.
+    """
+    if fmt == "rar" and unrar.available():
+        return "unrar"
+    if fmt in ("rar", "7z") and libarchive_engine.handles(archive_path):
+        return None
+    if (fmt == "7z" or (fmt == "rar" and not _rar_available())) and _7z_available():
+        return "7z"
+    return None
+
+
+async def extract_archive_async(archive_path: str, dest_dir: str, members=None,
+                                fmt: str | None = None,
+                                manifest: ArchiveManifest | None = None,
+                                job: ExtractJob | None = None,
+                                nested_depth: int = 0) -> list:
+    """
+    extract_archive() for the event loop. unrar and 7z jobs are driven as
+    asyncio subprocesses (no pool thread held, exact progress); every other
+    engine runs in the default executor.
+    """
+    loop = asyncio.get_event_loop()
+    if manifest is not None:
+        fmt = manifest.fmt
+    if fmt is None:
+        fmt = await loop.run_in_executor(None, _resolve_format, archive_path, None)
+
+    tool = subprocess_tool(fmt, archive_path)
+    if tool is None:
+        return await loop.run_in_executor(
+            None, extract_archive, archive_path, dest_dir, members, fmt, manifest,
+            job, nested_depth,
+        )
+
+    dest_dir = os.path.abspath(dest_dir)
+    os.makedirs(dest_dir, exist_ok=True)
+    expected = None
+    if manifest is not None:
+        wanted   = set(members) if members is not None else None
+        expected = sum(
+            e.size for e in manifest.entries if wanted is None or e.name in wanted
+        )
+    job = job or ExtractJob()
+    if job.input_size is None:
+        job.input_size = _input_size(archive_path)
+    if tool == "unrar":
+        counted = await unrar.run_unrar(
+            archive_path, dest_dir, members, job, expected, Config.EXTRACT_WORKERS,
+        )
+    else:
+        await run_7z(archive_path, dest_dir, members, job, expected)
+        counted = 0
+    # Without a manifest this walks the output tree: keep it off the loop.
+    await loop.run_in_executor(
+        None, _record_extracted, job, dest_dir, members, manifest, counted,
     )
-    name = Path(filename).name.lower()
-    return any(name.endswith(e) for e in exts)
+    if nested_depth:
+        await loop.run_in_executor(None, _extract_nested, job, nested_depth)
+    return job.paths
+
+
+def is_archive(filename: str) -> bool:
+    """
+    Return True if the name has a supported archive extension. Only the
+    name is looked at (it may come from a user); identify a downloaded
+    file by its contents with archive_format().
+    """
+    return format_from_name(filename) is not None
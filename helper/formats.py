@@ -0,0 +1,135 @@
+"""
+Archive format detection from magic bytes, with the filename as a hint.
+
+Format names used throughout the helpers:
+    zip, rar, 7z, tar, tar.gz, tar.bz2, tar.xz, tar.zst, tar.lz4,
+    gz, bz2, xz, zst, lz4
+and "other" for archives only libarchive reads (see extractor.archive_format).
+"""
+import io
+import os
+import bz2
+import zlib
+import lzma
+import logging
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+SNIFF_SIZE = 64 * 1024   # enough compressed input to reach the first tar header
+
+_SIGNATURES = (
+    (b"PK\x03\x04",             "zip"),
+    (b"PK\x05\x06",             "zip"),   # empty archive
+    (b"PK\x07\x08",             "zip"),   # spanned archive marker
+    (b"Rar!\x1a\x07",           "rar"),
+    (b"7z\xbc\xaf\x27\x1c",     "7z"),
+    (b"\x1f\x8b",               "gz"),
+    (b"BZh",                    "bz2"),
+    (b"\xfd7zXZ\x00",           "xz"),
+    (b"\x28\xb5\x2f\xfd",       "zst"),
+    (b"\x04\x22\x4d\x18",       "lz4"),
+)
+
+# Longest suffix first so ".tar.gz" wins over ".gz".
+_EXTENSIONS = (
+    (".tar.gz",  "tar.gz"),  (".tgz",  "tar.gz"),
+    (".tar.bz2", "tar.bz2"), (".tbz2", "tar.bz2"),
+    (".tar.xz",  "tar.xz"),  (".txz",  "tar.xz"),
+    (".tar.zst", "tar.zst"), (".tzst", "tar.zst"),
+    (".tar.lz4", "tar.lz4"),
+    (".tar", "tar"), (".zip", "zip"), (".rar", "rar"), (".7z", "7z"),
+    (".gz", "gz"), (".bz2", "bz2"), (".xz", "xz"),
+    (".zst", "zst"), (".lz4", "lz4"),
+)
+
+COMPRESSIONS = ("gz", "bz2", "xz", "zst", "lz4")
+
+# MIME types Telegram reports for archives sent without a usable extension.
+ARCHIVE_MIME_TYPES = {
+    "application/zip", "application/x-zip-compressed",
+    "application/vnd.rar", "application/x-rar-compressed", "application/x-rar",
+    "application/x-7z-compressed",
+    "application/x-tar", "application/gzip", "application/x-gzip",
+    "application/x-bzip2", "application/x-xz",
+    "application/zstd", "application/x-lz4",
+}
+
+
+def format_from_name(filename: str) -> str | None:
+    """Guess the format from the filename alone (no file access)."""
+    name = Path(filename).name.lower()
+    for ext, fmt in _EXTENSIONS:
+        if name.endswith(ext):
+            return fmt
+    return None
+
+
+def split_extension(filename: str) -> tuple:
+    """('photos', '.tar.gz') for 'photos.tar.gz'; (filename, '') if not an archive name."""
+    lower = filename.lower()
+    for ext, _ in _EXTENSIONS:
+        if lower.endswith(ext):
+            return filename[:-len(ext)], filename[-len(ext):]
+    return filename, ""
+
+
+def _is_tar(block: bytes) -> bool:
+    return block[257:262] == b"ustar"
+
+
+def _peek_decompressed(codec: str, head: bytes) -> bytes | None:
+    """Decompress the start of a stream, or None if it cannot be peeked."""
+    try:
+        if codec == "gz":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(head, 1024)
+        if codec == "xz":
+            return lzma.LZMADecompressor().decompress(head, 1024)
+        if codec == "bz2":
+            # bzip2 emits nothing until a whole block (up to 900 KB) is in.
+            return bz2.BZ2Decompressor().decompress(head, 1024) or None
+        if codec == "zst":
+            import zstandard
+            reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(head))
+            return reader.read(1024)
+        if codec == "lz4":
+            import lz4.frame
+            return lz4.frame.LZ4FrameDecompressor().decompress(head, 1024)
+    except Exception as e:
+        log.debug("Could not peek into %s stream: %s", codec, e)
+    return None
+
+
+def sniff_format(head: bytes, filename: str = "") -> str | None:
+    """
+    Identify the format from the first bytes of a file.
+
+    For compressed streams the start is decompressed to tell a tarball from
+    a single compressed file; when that is not possible (bzip2, missing
+    Python bindings) the filename decides. Returns None when the bytes
+    match no supported format.
+    """
+    fmt = None
+    for magic, name in _SIGNATURES:
+        if head.startswith(magic):
+            fmt = name
+            break
+
+    if fmt is None:
+        return "tar" if _is_tar(head) else None
+
+    if fmt in COMPRESSIONS:
+        inner = _peek_decompressed(fmt, head)
+        if inner is not None and len(inner) >= 262:
+            return f"tar.{fmt}" if _is_tar(inner) else fmt
+        hint = format_from_name(filename)
+        if hint == f"tar.{fmt}":
+            return hint
+    return fmt
+
+
+def detect_format(path: str) -> str | None:
+    """Read the first SNIFF_SIZE bytes of `path` and identify its format."""
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_SIZE)
+    return sniff_format(head, os.path.basename(path))
@@ -0,0 +1,154 @@
+"""
+Per-job extraction state shared by the bot UI and the extraction engines.
+
+Engines run in worker threads (or as asyncio subprocess drivers); the UI
+reads progress from the job and cancels it through the same object.
+"""
+import time
+import threading
+
+
+# The ratio guard only applies past this much output, so small, very
+# compressible archives (logs, sparse images) are never caught by it.
+RATIO_MIN_OUTPUT = 256 * 1024 * 1024
+
+
+class JobCancelled(RuntimeError):
+    """Raised inside an engine once the user has cancelled the job."""
+
+
+class OutputLimitExceeded(RuntimeError):
+    """Raised inside an engine once the job writes more than it may."""
+
+
+def _readable(nbytes: float) -> str:
+    # utils.get_readable_file_size pulls in pyrogram; engines run without it.
+    for unit in ("B", "KB", "MB", "GB"):
+        if nbytes < 1024:
+            return f"{nbytes:.1f} {unit}" if unit != "B" else f"{int(nbytes)} B"
+        nbytes /= 1024
+    return f"{nbytes:.1f} TB"
+
+
+class ExtractJob:
+    def __init__(self, timeout: float | None = None, max_output: int | None = None,
+                 max_ratio: float | None = None):
+        self.timeout    = timeout      # wall-clock limit in seconds
+        self.max_output = max_output   # limit on bytes written
+        self.max_ratio  = max_ratio    # limit on bytes written per archive byte
+        self.input_size = None         # archive size, set by extract_archive
+        self.started    = time.monotonic()
+        self.percent    = None         # exact percentage, if the engine reports one
+        self.bytes_done   = 0          # uncompressed bytes written so far
+        self.members_done = 0          # members finished so far
+        self.files        = []         # (path, size) of each file, as written
+        self._lock      = threading.Lock()
+        self._cancel    = threading.Event()
+        self._parent    = None
+
+    def add(self, nbytes: int = 0, members: int = 0):
+        """
+        Engines call this as they write; readers just look at the fields.
+        Raises OutputLimitExceeded in the writing engine once the job goes
+        over its byte budget or compression ratio.
+        """
+        with self._lock:
+            self.bytes_done   += nbytes
+            self.members_done += members
+            done = self.bytes_done
+        if self._parent and nbytes:
+            self._parent.add(nbytes)
+        if nbytes > 0:
+            self.check_output(done)
+
+    def check_output(self, done: int):
+        """Raise OutputLimitExceeded if `done` bytes would break the job's limits."""
+        if self.max_output is not None and done > self.max_output:
+            raise OutputLimitExceeded(
+                f"Archive unpacks to more than {_readable(self.max_output)}, "
+                f"the limit for your plan."
+            )
+        if (
+            self.max_ratio and self.input_size
+            and done > RATIO_MIN_OUTPUT
+            and done > self.input_size * self.max_ratio
+        ):
+            raise OutputLimitExceeded(
+                f"Archive expands more than {self.max_ratio:g}x "
+                f"its size; refusing a likely zip bomb."
+            )
+
+    def output_budget(self) -> int | None:
+        """Bytes this job may still write before a limit trips, or None."""
+        caps = []
+        if self.max_output is not None:
+            caps.append(self.max_output)
+        if self.max_ratio and self.input_size:
+            caps.append(max(int(self.input_size * self.max_ratio), RATIO_MIN_OUTPUT))
+        return min(caps) - self.bytes_done if caps else None
+
+    def add_file(self, path: str, size: int):
+        """Record a finished file (counts as one member)."""
+        with self._lock:
+            self.files.append((path, size))
+            self.members_done += 1
+
+    def add_files(self, files):
+        """Record finished files whose members were already counted."""
+        with self._lock:
+            self.files.extend(files)
+
+    @property
+    def paths(self) -> list:
+        with self._lock:
+            return [p for p, _ in self.files]
+
+    def report_percent(self, percent: int, total: int | None = None):
+        """For engines that only know a percentage (7z): derive the byte count."""
+        self.percent = percent
+        if total:
+            self.add(total * percent // 100 - self.bytes_done)
+
+    def child(self) -> "ExtractJob":
+        """
+        Sub-job for a nested archive. It shares cancellation and the clock,
+        gets what is left of the output limit, and forwards its bytes here;
+        its files only become ours through adopt().
+        """
+        sub = ExtractJob(self.timeout, max_ratio=self.max_ratio)
+        if self.max_output is not None:
+            sub.max_output = max(self.max_output - self.bytes_done, 0)
+        sub.started = self.started
+        sub._cancel = self._cancel
+        sub._parent = self
+        return sub
+
+    def adopt(self, sub: "ExtractJob", replaced: str):
+        """Swap the file at `replaced` (a nested archive) for what `sub` wrote."""
+        with self._lock:
+            self.files = [f for f in self.files if f[0] != replaced] + sub.files
+            self.members_done += len(sub.files) - 1
+
+    def discard(self, sub: "ExtractJob"):
+        """Take back the bytes a failed sub-job forwarded."""
+        self.add(-sub.bytes_done)
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def check(self):
+        """Raise if the job was cancelled or ran out of time."""
+        if self._cancel.is_set():
+            raise JobCancelled("Extraction cancelled.")
+        if self.timeout and self.elapsed > self.timeout:
+            raise RuntimeError(
+                f"Extraction timed out after {int(self.timeout)}s."
+            )
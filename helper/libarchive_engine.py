@@ -0,0 +1,134 @@
+"""
+In-process archive engine on libarchive (through the libarchive-c bindings).
+
+Reads RAR, 7z, bare compressed streams and whatever else libarchive
+recognises (ISO 9660, cpio, ar, ...) member by member without forking 7z
+or unrar. Bytes are counted as blocks are written, so progress is exact,
+and cancellation and the output limits take effect between blocks.
+
+Without the bindings or the shared library available() is False, and
+helper.extractor keeps using its subprocess engines.
+"""
+import os
+import contextlib
+
+from helper.formats import COMPRESSIONS
+from helper.job import ExtractJob
+from helper.manifest import ManifestEntry
+from helper.utils import safe_join
+from helper.volumes import ConcatFile, volume_info, volume_paths
+
+try:
+    import libarchive
+except (ImportError, OSError):   # bindings or libarchive.so missing
+    libarchive = None
+
+BLOCK_SIZE = 1024 * 1024
+
+# Formats libarchive bids on from loose text heuristics; a file only they
+# claim is not treated as an archive.
+_WEAK_FORMATS = (b"mtree",)
+
+
+def available() -> bool:
+    return libarchive is not None
+
+
+def handles(archive_path: str) -> bool:
+    """
+    True if this engine can read the archive. RAR volume sets need
+    libarchive's multi-file reader, which the bindings don't expose, so
+    those stay with unrar / 7z.
+    """
+    if libarchive is None:
+        return False
+    vol = volume_info(archive_path)
+    return not (vol and vol.fmt == "rar" and len(volume_paths(archive_path)) > 1)
+
+
+@contextlib.contextmanager
+def _reader(archive_path: str, fmt: str | None):
+    """Open the archive (every part of a byte-split set) for one forward pass."""
+    options = {"block_size": BLOCK_SIZE}
+    if fmt in COMPRESSIONS:
+        options["format_name"] = "raw"   # a bare stream is one unnamed member
+    try:
+        vol = volume_info(archive_path)
+        if vol and vol.fmt != "rar":
+            with ConcatFile(volume_paths(archive_path)) as f:
+                with libarchive.stream_reader(f, **options) as archive:
+                    yield archive
+        else:
+            with libarchive.file_reader(archive_path, **options) as archive:
+                yield archive
+    except libarchive.ArchiveError as e:
+        raise RuntimeError(f"libarchive: {e.msg}") from e
+
+
+def identify(archive_path: str) -> bool:
+    """True if libarchive can read an entry header from the file."""
+    if libarchive is None:
+        return False
+    try:
+        with _reader(archive_path, None) as archive:
+            for _ in archive:
+                return not (archive.format_name or b"").lower().startswith(_WEAK_FORMATS)
+    except RuntimeError:
+        pass
+    return False
+
+
+def list_entries(archive_path: str, fmt: str) -> list:
+    """ManifestEntry items for the regular files, from the headers alone."""
+    with _reader(archive_path, fmt) as archive:
+        return [ManifestEntry(e.pathname, e.size or 0) for e in archive if e.isreg]
+
+
+def read_members(archive_path: str, fmt: str, members=None,
+                 stream_name: str | None = None):
+    """
+    Yield (name, entry) for each regular file (only `members`, if given) in
+    archive order; read an entry's data with entry.get_blocks() before
+    advancing. `stream_name` names the single member of a bare stream.
+    Stops reading the archive once every selected member has been seen.
+    """
+    wanted = set(members) if members is not None else None
+    with _reader(archive_path, fmt) as archive:
+        for entry in archive:
+            if not entry.isreg:
+                continue
+            name = stream_name if fmt in COMPRESSIONS else entry.pathname
+            if wanted is not None:
+                if name not in wanted:
+                    continue
+                wanted.discard(name)
+            yield name, entry
+            if wanted is not None and not wanted:
+                return
+
+
+def extract(archive_path: str, dest_dir: str, fmt: str, members=None,
+            job: ExtractJob | None = None, stream_name: str | None = None) -> None:
+    """
+    Extract (all or only `members`) into dest_dir, recording each file in
+    the job as it is finished. Only regular files are written; links,
+    devices and the like are skipped.
+    """
+    job = job or ExtractJob()
+    dest_dir = os.path.realpath(dest_dir)
+    made = set()
+    for name, entry in read_members(archive_path, fmt, members, stream_name):
+        job.check()
+        target = safe_join(dest_dir, name)
+        parent = os.path.dirname(target)
+        if parent not in made:
+            os.makedirs(parent, exist_ok=True)
+            made.add(parent)
+        size = 0
+        with open(target, "wb") as out:
+            for block in entry.get_blocks(BLOCK_SIZE):
+                out.write(block)
+                size += len(block)
+                job.add(len(block))
+                job.check()
+        job.add_file(target, size)
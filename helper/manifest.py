@@ -0,0 +1,67 @@
+"""
+Archive manifest: the archive index read once and shared by every stage of
+a job (size probe, progress, selection keyboard, extraction, streaming).
+"""
+import os
+import zipfile
+import threading
+from typing import NamedTuple
+
+from helper.volumes import open_zip
+
+
+class ManifestEntry(NamedTuple):
+    name: str                         # member path inside the archive
+    size: int                         # uncompressed size
+    compressed_size: int | None = None
+    crc: int | None = None
+
+
+class ArchiveManifest:
+    """
+    Member names, sizes, compressed sizes and CRCs of one archive plus its
+    detected format. For ZIP archives the ZipFile that produced the listing
+    is kept open so later stages don't parse the central directory again.
+    """
+
+    def __init__(self, path: str, fmt: str, entries: list, zip_file=None):
+        self.path       = path
+        self.fmt        = fmt
+        self.entries    = entries
+        self.total_size = sum(e.size for e in entries)
+        self._zip       = zip_file
+        self._lock      = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def names(self, indices) -> list:
+        return [self.entries[i].name for i in indices]
+
+    def size_of(self, indices) -> int:
+        return sum(self.entries[i].size for i in indices)
+
+    def zip_file(self) -> zipfile.ZipFile:
+        """Shared ZipFile handle; safe to open members from several threads."""
+        with self._lock:
+            if self._zip is None:
+                self._zip = open_zip(self.path)
+            return self._zip
+
+    def close(self):
+        with self._lock:
+            if self._zip is not None:
+                self._zip.close()
+                self._zip = None
+
+    @classmethod
+    def from_files(cls, dest_dir: str, fmt: str, files: list) -> "ArchiveManifest":
+        """
+        Manifest for an archive that had to be extracted before listing.
+        `files` are the (path, size) pairs the extraction recorded.
+        """
+        entries = [
+            ManifestEntry(os.path.relpath(path, dest_dir), size)
+            for path, size in files
+        ]
+        return cls(dest_dir, fmt, entries)
@@ -0,0 +1,179 @@
+"""
+RAM-backed fast path for small archives.
+
+Archives up to Config.IN_MEMORY_MAX are downloaded into a BytesIO, listed
+and unpacked from it, and their members are uploaded from BytesIO buffers,
+so nothing touches DOWNLOAD_DIR. Every buffer is charged to one process-wide
+MemoryBudget; when it is spent, jobs take the regular disk path instead.
+"""
+import io
+import os
+import tarfile
+import zipfile
+import threading
+import contextlib
+
+from config import Config
+from helper.extractor import py_decompressor
+from helper.formats import SNIFF_SIZE, format_from_name, sniff_format
+from helper.manifest import ArchiveManifest, ManifestEntry
+
+# Formats Python reads without helper tools. RAR / 7z and bare streams (whose
+# uncompressed size is unknown up front) always go to disk.
+MEMORY_FORMATS = ("zip", "tar", "tar.gz", "tar.bz2", "tar.xz", "tar.zst", "tar.lz4")
+
+
+class MemoryBudget:
+    """Bytes of archive and member data all jobs together may keep in RAM."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used  = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, nbytes: int) -> bool:
+        """Claim nbytes; False (and nothing claimed) if that would go over the limit."""
+        with self._lock:
+            if self.used + nbytes > self.limit:
+                return False
+            self.used += nbytes
+            return True
+
+    def release(self, nbytes: int):
+        with self._lock:
+            self.used = max(self.used - nbytes, 0)
+
+
+budget = MemoryBudget(Config.IN_MEMORY_TOTAL)
+
+
+def fits_in_memory(filename: str, size: int) -> bool:
+    """Whether an archive of this name and size should take the in-memory path."""
+    return 0 < size <= Config.IN_MEMORY_MAX and format_from_name(filename) in MEMORY_FORMATS
+
+
+class MemoryArchive:
+    """
+    A downloaded archive held in a BytesIO, plus the members unpacked from
+    it. `reserved` is what the caller already claimed from the budget for
+    the download; it is given back by close() or spill().
+    """
+
+    def __init__(self, buf: io.BytesIO, reserved: int):
+        self.buf      = buf
+        self.manifest = None
+        self._held    = reserved
+        self._members = {}     # member name → BytesIO
+
+    @property
+    def name(self) -> str:
+        return self.buf.name
+
+    @name.setter
+    def name(self, value: str):
+        self.buf.name = value
+
+    def _head(self) -> bytes:
+        self.buf.seek(0)
+        return self.buf.read(SNIFF_SIZE)
+
+    @contextlib.contextmanager
+    def _open_tar(self, fmt: str):
+        self.buf.seek(0)
+        if fmt == "tar":
+            with tarfile.open(fileobj=self.buf, mode="r:") as tf:
+                yield tf
+            return
+        with py_decompressor(self.buf, fmt.split(".", 1)[1]) as reader:
+            with tarfile.open(fileobj=reader, mode="r|") as tf:
+                yield tf
+
+    def list(self) -> ArchiveManifest | None:
+        """
+        Read the archive index from memory. Returns None when the format
+        can't be handled here and the caller should spill() to disk.
+        """
+        fmt = sniff_format(self._head(), self.name)
+        if fmt not in MEMORY_FORMATS:
+            return None
+        if fmt == "zip":
+            self.buf.seek(0)
+            zf = zipfile.ZipFile(self.buf, "r")
+            entries = [
+                ManifestEntry(i.filename, i.file_size, i.compress_size, i.CRC)
+                for i in zf.infolist() if not i.is_dir()
+            ]
+            self.manifest = ArchiveManifest(self.name, fmt, entries, zip_file=zf)
+        else:
+            with self._open_tar(fmt) as tf:
+                entries = [ManifestEntry(m.name, m.size) for m in tf if m.isfile()]
+            self.manifest = ArchiveManifest(self.name, fmt, entries)
+        return self.manifest
+
+    def extract(self, names: list) -> bool:
+        """
+        Unpack `names` into memory buffers. Returns False, having unpacked
+        nothing, if the members don't fit in the memory budget.
+        """
+        sizes = {e.name: e.size for e in self.manifest.entries}
+        need  = sum(sizes[n] for n in names)
+        if not budget.reserve(need):
+            return False
+        self._held += need
+
+        wanted = set(names)
+        if self.manifest.fmt == "zip":
+            zf = self.manifest.zip_file()
+            for name in names:
+                self._keep(name, zf.read(name))
+        else:
+            with self._open_tar(self.manifest.fmt) as tf:
+                for m in tf:
+                    if m.isfile() and m.name in wanted:
+                        self._keep(m.name, tf.extractfile(m).read())
+        return True
+
+    def _keep(self, name: str, data: bytes):
+        buf = io.BytesIO(data)
+        buf.name = os.path.basename(name)   # read by Pyrogram for the upload
+        buf.size = len(data)
+        self._members[name] = buf
+
+    def member(self, name: str) -> io.BytesIO | None:
+        """The unpacked buffer for `name`, if extract() produced one."""
+        return self._members.get(name)
+
+    def drop(self, name: str):
+        """Free one member's buffer once it has been uploaded."""
+        buf = self._members.pop(name, None)
+        if buf is not None:
+            self._held -= buf.size
+            budget.release(buf.size)
+            buf.close()
+
+    def spill(self, folder: str) -> str:
+        """
+        Write the archive under `folder` for the disk path and free the
+        memory. The manifest keeps working against the file on disk.
+        """
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, os.path.basename(self.name))
+        with open(path, "wb") as f:
+            f.write(self.buf.getbuffer())
+        if self.manifest is not None:
+            self.manifest.close()
+            self.manifest.path = path
+            self.manifest = None
+        self.close()
+        return path
+
+    def close(self):
+        """Free everything this archive holds."""
+        if self.manifest is not None:
+            self.manifest.close()
+        for buf in self._members.values():
+            buf.close()
+        self._members.clear()
+        self.buf.close()
+        budget.release(self._held)
+        self._held = 0
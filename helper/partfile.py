@@ -0,0 +1,114 @@
+"""
+Resumable download state.
+
+A URL download is written to `<file>.part`, next to a `<file>.part.json`
+sidecar holding the URL, the size, the validator (ETag or Last-Modified)
+and the byte ranges still missing. After a network error, or when the same
+URL is sent again after a restart, the missing ranges are requested with
+Range + If-Range. A server that answers with the whole file instead (it
+changed, or it no longer serves ranges) starts the download over, so
+bytes of two versions are never mixed.
+"""
+import os
+import json
+import time
+
+from helper.segmented import Segment
+
+SAVE_EVERY = 1.0   # seconds between sidecar writes while downloading
+
+
+class PartFile:
+    """The .part file and sidecar of one download to `path`."""
+
+    def __init__(self, path: str, url: str):
+        self.path      = path
+        self.part      = path + ".part"
+        self.meta      = self.part + ".json"
+        self.url       = url
+        self.size      = None
+        self.validator = None
+        self.missing   = []   # Segment ranges not downloaded yet, updated as bytes arrive
+        self._saved    = 0.0
+
+    @property
+    def resumable(self) -> bool:
+        return bool(self.size and self.validator)
+
+    @property
+    def done(self) -> int:
+        """Bytes already in the .part file."""
+        return self.size - sum(seg.left for seg in self.missing) if self.size else 0
+
+    def load(self) -> bool:
+        """Pick up the state a previous attempt left; False if there is none to resume."""
+        try:
+            with open(self.meta, encoding="utf-8") as f:
+                meta = json.load(f)
+            if (
+                meta["url"] != self.url
+                or os.path.getsize(self.part) != meta["size"]
+                or not meta["missing"]
+            ):
+                raise ValueError("stale sidecar")
+            self.size      = meta["size"]
+            self.validator = meta["validator"]
+            self.missing   = [Segment(pos, end) for pos, end in sorted(meta["missing"])]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.discard()
+            return False
+        return self.resumable
+
+    def start(self, size: int | None, validator: str | None):
+        """Begin from byte zero: preallocate the .part file and record its state."""
+        self.size      = size or None
+        self.validator = validator
+        self.missing   = [Segment(0, size)] if size else []
+        with open(self.part, "wb") as f:
+            if size:
+                f.truncate(size)
+        if self.resumable:
+            self.save()
+        elif os.path.exists(self.meta):
+            os.remove(self.meta)
+
+    def due(self) -> bool:
+        """True (once) every SAVE_EVERY seconds while a resumable download runs."""
+        now = time.monotonic()
+        if not self.resumable or now - self._saved < SAVE_EVERY:
+            return False
+        self._saved = now
+        return True
+
+    def state(self) -> dict:
+        """The sidecar contents for the bytes received so far."""
+        return {
+            "url": self.url, "size": self.size, "validator": self.validator,
+            "missing": [[seg.pos, seg.end] for seg in self.missing if seg.left],
+        }
+
+    def save(self, meta: dict | None = None):
+        """
+        Write the sidecar: `meta` from state(), taken once the bytes it
+        counts are on disk, or else the current state.
+        """
+        if not self.resumable:
+            return
+        self._saved = time.monotonic()
+        meta = meta or self.state()
+        tmp = self.meta + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta)
+
+    def finish(self) -> str:
+        """Move the completed download into place and drop the sidecar."""
+        os.replace(self.part, self.path)
+        if os.path.exists(self.meta):
+            os.remove(self.meta)
+        return self.path
+
+    def discard(self):
+        for path in (self.part, self.meta):
+            if os.path.exists(path):
+                os.remove(path)
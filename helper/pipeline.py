@@ -0,0 +1,191 @@
+"""
+Download → extract pipeline for tarballs.
+
+Tar needs nothing but a forward read, so the chunks of a download in
+progress (Pyrogram's stream_media or an aiohttp body) are handed through a
+bounded queue to a streaming tar reader in a worker thread. Extraction
+overlaps the download and the archive itself is never written to disk.
+"""
+import io
+import os
+import queue
+import asyncio
+import threading
+
+from helper.extractor import extract_tar_stream
+from helper.formats import SNIFF_SIZE, sniff_format
+from helper.job import ExtractJob
+from helper.writer import FileWriter
+
+# Formats that can be extracted from a forward-only stream.
+PIPE_FORMATS = ("tar", "tar.gz", "tar.bz2", "tar.xz", "tar.zst", "tar.lz4")
+
+QUEUE_DEPTH = 16   # chunks buffered between the download and the extractor
+
+_EOF = object()
+
+
+class ChunkPipe(io.RawIOBase):
+    """
+    Read-only file object fed with chunks from the event loop. The writer
+    awaits feed() and end() (or calls fail()); the reader, in a worker
+    thread, blocks in read() until data arrives. close() on the reader side
+    makes the next feed() return False so the download can stop.
+    """
+
+    def __init__(self, depth: int = QUEUE_DEPTH):
+        super().__init__()
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop  = threading.Event()
+        self._error = None
+        self._chunk = b""
+        self._pos   = 0
+        self._eof   = False
+
+    # ── Writer (event loop) ───────────────────────────────────────────────────
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def feed(self, chunk) -> bool:
+        """Queue a chunk; False once the reader has stopped reading."""
+        if self._stop.is_set():
+            return False
+        try:
+            self._queue.put_nowait(chunk)
+            return True
+        except queue.Full:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._put, chunk)
+
+    async def end(self):
+        """Mark the end of the data."""
+        await self.feed(_EOF)
+
+    def fail(self, error: BaseException):
+        """The download broke off; the reader raises once the queue drains."""
+        self._error = error
+
+    # ── Reader (worker thread) ────────────────────────────────────────────────
+    def readable(self) -> bool:
+        return True
+
+    def _next(self) -> bool:
+        while True:
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._error is not None:
+                    raise RuntimeError(f"Download failed: {self._error}") from self._error
+                continue
+            if item is _EOF:
+                self._eof = True
+                return False
+            self._chunk, self._pos = item, 0
+            return True
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        while size != 0 and not self._eof:
+            if self._pos >= len(self._chunk) and not self._next():
+                break
+            end   = len(self._chunk) if size < 0 else self._pos + size
+            piece = self._chunk[self._pos:end]
+            self._pos += len(piece)
+            parts.append(piece)
+            if size > 0:
+                size -= len(piece)
+        return b"".join(parts)
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._stop.set()
+        super().close()
+
+
+async def sniff_stream(chunks, filename: str = ""):
+    """
+    Read enough of an async chunk iterator to identify its format. Returns
+    (fmt, chunks) where the new iterator yields the whole stream again.
+    """
+    head = []
+    size = 0
+    async for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= SNIFF_SIZE:
+            break
+    fmt = sniff_format(b"".join(head)[:SNIFF_SIZE], filename)
+
+    async def _replay():
+        for chunk in head:
+            yield chunk
+        async for chunk in chunks:
+            yield chunk
+    return fmt, _replay()
+
+
+async def spool(chunks, path: str, progress=None, total: int = 0) -> str:
+    """Write an async chunk iterator to `path`; `progress(done, total)` is awaited per chunk."""
+    done   = 0
+    writer = FileWriter(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        async for chunk in chunks:
+            await writer.write(chunk)
+            done += len(chunk)
+            if progress:
+                await progress(done, total)
+    finally:
+        await writer.close()
+    return path
+
+
+def _extract(pipe: ChunkPipe, dest_dir: str, fmt: str, job: ExtractJob) -> list:
+    try:
+        return extract_tar_stream(pipe, dest_dir, fmt, job)
+    finally:
+        pipe.close()
+
+
+async def extract_download(chunks, dest_dir: str, fmt: str, job: ExtractJob,
+                           total: int | None = None) -> list:
+    """
+    Extract the tarball arriving as `chunks` (an async iterator of bytes)
+    while it downloads, and return the written paths. `total`, the
+    download size if known, drives job.percent.
+
+    Raises whatever the download raised, or what extract_tar_stream raises
+    (JobCancelled, OutputLimitExceeded, RuntimeError); either way the
+    other side is stopped first.
+    """
+    pipe    = ChunkPipe()
+    loop    = asyncio.get_running_loop()
+    extract = loop.run_in_executor(None, _extract, pipe, dest_dir, fmt, job)
+    fed = 0
+    try:
+        async for chunk in chunks:
+            if not await pipe.feed(chunk):
+                break   # extraction finished or failed; its result tells
+            fed += len(chunk)
+            if total:
+                job.percent = min(fed * 100 // total, 99)
+        await pipe.end()
+    except BaseException as e:
+        pipe.fail(e)
+        try:
+            await extract
+        except Exception:
+            pass
+        raise
+    paths = await extract
+    job.percent = 100 if total else None
+    return paths
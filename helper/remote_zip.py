@@ -0,0 +1,194 @@
+"""
+Remote ZIP archives read through HTTP Range requests.
+
+A ZIP keeps its index at the end, so listing it only takes the
+end-of-central-directory record and the central directory, and every
+member is one contiguous byte range. RemoteZip mirrors what it fetches into
+a sparse local file as large as the remote archive: the fetched parts sit
+at their real offsets and the holes take no disk space, so the usual ZIP
+code (listing, extraction, streaming uploads) works on that file as long as
+it only reads members that were fetched.
+"""
+import os
+import bisect
+import zipfile
+
+import aiohttp
+
+from helper.segmented import content_range, validator
+from helper.writer import FileWriter
+from utils import http_session
+
+TAIL_SIZE  = 128 * 1024        # first request: EOCD, comment, zip64 records, often the whole index
+CHUNK_SIZE = 256 * 1024
+MERGE_GAP  = 1024 * 1024       # selected members closer than this are fetched in one request
+
+_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=30)
+
+
+class _Missing(Exception):
+    """zipfile read bytes that haven't been fetched yet."""
+
+    def __init__(self, start: int, end: int):
+        super().__init__(f"bytes {start}-{end} not fetched")
+        self.start = start
+        self.end   = end
+
+
+class _Sparse:
+    """Read-only view of the local copy that raises _Missing on holes."""
+
+    def __init__(self, f, have: list, size: int):
+        self._f    = f
+        self._have = have
+        self._size = size
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._f.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._f.tell()
+
+    def read(self, n: int = -1) -> bytes:
+        pos = self._f.tell()
+        end = self._size if n is None or n < 0 else min(pos + n, self._size)
+        if pos < end and not any(s <= pos and end <= e for s, e in self._have):
+            raise _Missing(pos, end)
+        return self._f.read(end - pos)
+
+    def close(self):
+        pass
+
+
+class RemoteZip:
+    """
+    A ZIP at `url`, mirrored into the sparse file `path`. Create it with
+    open(); fetch() then downloads the members picked from its listing.
+    """
+
+    def __init__(self, url: str, path: str, size: int, validator: str | None):
+        self.url       = url
+        self.path      = path
+        self.size      = size
+        self.validator = validator   # ETag / Last-Modified, sent as If-Range
+        self._have     = []          # fetched (start, end) byte ranges
+        self._spans    = {}          # member name → (start, end) of its local header and data
+
+    @classmethod
+    async def open(cls, url: str, path: str) -> "RemoteZip | None":
+        """
+        Fetch the archive's index into `path`. Returns None if the server
+        doesn't serve byte ranges; raises on network errors or a file that
+        is not a ZIP. `path` is removed unless a RemoteZip is returned.
+        """
+        remote = None
+        try:
+            remote = await cls._open(url, path)
+            return remote
+        finally:
+            if remote is None and os.path.exists(path):
+                os.remove(path)
+
+    @classmethod
+    async def _open(cls, url: str, path: str) -> "RemoteZip | None":
+        session = http_session()
+        headers = {"Range": f"bytes=-{TAIL_SIZE}"}
+        async with session.get(url, headers=headers, timeout=_TIMEOUT) as resp:
+            resp.raise_for_status()
+            rng = content_range(resp)
+            if rng is None:
+                return None
+            remote = cls(url, path, rng[2], validator(resp))
+            with open(path, "wb") as f:
+                f.truncate(remote.size)
+            await remote._write(resp, rng[0])
+        await remote._read_index(session)
+        return remote
+
+    async def _read_index(self, session: aiohttp.ClientSession):
+        # Let zipfile parse the local copy; each hole it runs into (zip64
+        # records, the rest of the central directory) is fetched and retried.
+        for _ in range(4):
+            try:
+                with open(self.path, "rb") as f:
+                    with zipfile.ZipFile(_Sparse(f, self._have, self.size)) as zf:
+                        infos     = zf.infolist()
+                        start_dir = zf.start_dir
+                break
+            except _Missing as e:
+                await self._fetch(session, e.start, e.end)
+        else:
+            raise RuntimeError("Could not read the ZIP index.")
+
+        # A member runs from its local header to the next one (or the index).
+        offsets = sorted({i.header_offset for i in infos} | {start_dir})
+        for info in infos:
+            end = offsets[bisect.bisect_right(offsets, info.header_offset)]
+            self._spans[info.filename] = (info.header_offset, end)
+
+    def _missing_spans(self, members) -> list:
+        """Byte ranges still to fetch for `members`, merged across small gaps."""
+        spans = sorted(
+            span for span in {self._spans[m] for m in members}
+            if not any(s <= span[0] and span[1] <= e for s, e in self._have)
+        )
+        merged = []
+        for start, end in spans:
+            if merged and start - merged[-1][1] <= MERGE_GAP:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return merged
+
+    def span_size(self, members) -> int:
+        """Bytes fetch() would download for `members`."""
+        return sum(end - start for start, end in self._missing_spans(members))
+
+    async def fetch(self, members, progress=None) -> int:
+        """
+        Download the local headers and data of `members` into the local
+        copy. `progress(done, total)` is awaited per chunk. Returns the
+        number of bytes fetched.
+
+        Raises:
+            RuntimeError: If the remote file changed since it was listed.
+        """
+        spans = self._missing_spans(members)
+        total = sum(end - start for start, end in spans)
+        done  = 0
+
+        async def _advance(n: int):
+            nonlocal done
+            done += n
+            if progress:
+                await progress(done, total)
+
+        session = http_session()
+        for start, end in spans:
+            await self._fetch(session, start, end, _advance)
+        return total
+
+    async def _fetch(self, session: aiohttp.ClientSession, start: int, end: int,
+                     advance=None):
+        headers = {"Range": f"bytes={start}-{end - 1}"}
+        if self.validator:
+            headers["If-Range"] = self.validator
+        async with session.get(self.url, headers=headers, timeout=_TIMEOUT) as resp:
+            resp.raise_for_status()
+            rng = content_range(resp)
+            if rng is None or rng[0] != start:
+                raise RuntimeError("The remote file changed since it was listed.")
+            await self._write(resp, start, advance)
+
+    async def _write(self, resp: aiohttp.ClientResponse, offset: int, advance=None):
+        done   = 0
+        writer = FileWriter(self.path)
+        try:
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                await writer.write(chunk, offset + done)
+                done += len(chunk)
+                if advance:
+                    await advance(len(chunk))
+        finally:
+            await writer.close()
+        self._have.append((offset, offset + done))
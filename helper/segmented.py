@@ -0,0 +1,179 @@
+"""
+Multi-connection downloads for servers that serve byte ranges.
+
+Many file hosts throttle each connection, so a single GET uses a fraction
+of the bandwidth available. The file is preallocated, split into one
+segment per connection, and every segment is fetched with its own Range
+request and written at its own offset. A connection that finishes early
+takes over the tail of the segment that would otherwise finish last,
+sized by the two connections' speeds, so a slow connection can't hold up
+the end of the download.
+"""
+import re
+import time
+import asyncio
+
+import aiohttp
+
+from helper.writer import FileWriter
+
+CHUNK_SIZE = 256 * 1024
+MIN_SPLIT  = 512 * 1024   # segments with less than this left are not split
+
+_TIMEOUT       = aiohttp.ClientTimeout(total=None, connect=30, sock_read=60)
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class Segment:
+    """Bytes [pos, end) of the file; `end` moves down when the segment is split."""
+
+    __slots__ = ("pos", "end", "since", "fetched")
+
+    def __init__(self, pos: int, end: int):
+        self.pos     = pos
+        self.end     = end
+        self.since   = time.monotonic()
+        self.fetched = 0
+
+    @property
+    def left(self) -> int:
+        return max(0, self.end - self.pos)
+
+    def rate(self, now: float) -> float:
+        """Bytes per second so far (0 until data arrives)."""
+        return self.fetched / (now - self.since) if now > self.since else 0.0
+
+
+def accepts_ranges(resp: aiohttp.ClientResponse) -> bool:
+    """True if the response says byte ranges of the URL can be requested."""
+    return resp.headers.get("Accept-Ranges", "").strip().lower() == "bytes"
+
+
+def content_range(resp: aiohttp.ClientResponse) -> tuple | None:
+    """(first byte, last byte, total size) from a 206 response, or None."""
+    m = _CONTENT_RANGE.fullmatch(resp.headers.get("Content-Range", "").strip())
+    if resp.status != 206 or not m:
+        return None
+    return int(m.group(1)), int(m.group(2)), int(m.group(3))
+
+
+def validator(resp: aiohttp.ClientResponse) -> str | None:
+    """The response's strong ETag, or its Last-Modified, for If-Range."""
+    etag = resp.headers.get("ETag", "")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return resp.headers.get("Last-Modified")
+
+
+async def download_segmented(session: aiohttp.ClientSession, url: str, writer: FileWriter,
+                             segments: list, connections: int, progress=None,
+                             first: aiohttp.ClientResponse | None = None,
+                             if_range: str | None = None) -> None:
+    """
+    Fill the byte ranges `segments` (Segment objects) of a preallocated
+    file, open in `writer`, from `url` over up to `connections` concurrent
+    Range requests. The list is updated in place as chunks are queued for
+    writing and segments are split, so the caller can checkpoint what is
+    still missing (after writer.flush()). `progress(done)` is awaited per
+    chunk with the bytes received so far.
+
+    `first` is a response already open at the start of segments[0] (the
+    GET that revealed the size); it is read for that segment instead of
+    opening another connection. `if_range`, the validator of that
+    response, keeps every other request on the same version of the file.
+
+    Raises:
+        aiohttp.ClientError: On a network error in any segment.
+        RuntimeError: If the server stops honouring the ranges or the file
+            changes while it downloads.
+    """
+    headers = {"If-Range": if_range} if if_range else {}
+    done    = 0
+
+    async def _fill(seg: Segment, resp: aiohttp.ClientResponse):
+        nonlocal done
+        async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+            chunk = chunk[:seg.left]   # the segment may have been split meanwhile
+            # Claim the bytes before writing, so a split made while the
+            # write waits starts after them.
+            pos = seg.pos
+            seg.pos     += len(chunk)
+            seg.fetched += len(chunk)
+            done        += len(chunk)
+            await writer.write(chunk, pos)
+            if progress:
+                await progress(done)
+            if not seg.left:
+                return
+
+    owned = set()   # segments a worker is on
+
+    def _next(rate: float) -> Segment | None:
+        # A segment nobody is on yet, or else the tail of the one that
+        # would finish last, leaving it as much as it can fetch in the time
+        # we need for the rest.
+        for seg in segments:
+            if seg.left and seg not in owned:
+                owned.add(seg)
+                return seg
+        now = time.monotonic()
+
+        def _eta(s: Segment) -> tuple:
+            r = s.rate(now)
+            return (s.left / r if r else float("inf")), s.left
+
+        seg = max((s for s in segments if s.left), key=_eta, default=None)
+        if seg is None or seg.left < MIN_SPLIT:
+            return None
+        theirs = seg.rate(now)
+        if theirs and rate:
+            keep = int(seg.left * theirs / (theirs + rate))
+        else:
+            keep = seg.left // 2
+        new = Segment(seg.pos + keep, seg.end)
+        seg.end = new.pos
+        segments.append(new)
+        owned.add(new)
+        return new
+
+    async def _worker(seg: Segment | None, resp: aiohttp.ClientResponse | None = None):
+        if resp is not None:
+            # The rest of its body belongs to other segments: drop the
+            # connection now rather than hold it for the whole download.
+            try:
+                await _fill(seg, resp)
+            finally:
+                resp.close()
+        while seg is not None:
+            while seg.left:
+                before = seg.pos
+                ranged = {**headers, "Range": f"bytes={seg.pos}-{seg.end - 1}"}
+                async with session.get(url, headers=ranged, timeout=_TIMEOUT) as r:
+                    r.raise_for_status()
+                    if r.status != 206:
+                        raise RuntimeError("The server stopped serving byte ranges.")
+                    await _fill(seg, r)
+                if seg.left and seg.pos == before:
+                    raise RuntimeError("The server sent no data for a byte range.")
+            seg = _next(seg.rate(time.monotonic()))
+
+    # One segment per connection to start with, splitting the largest
+    # while there are too few. segments[0] comes first, for `first`.
+    active = []
+    while len(active) < connections:
+        seg = _next(0.0)
+        if seg is None:
+            break
+        active.append(seg)
+
+    tasks = [
+        asyncio.create_task(_worker(seg, first if i == 0 else None))
+        for i, seg in enumerate(active)
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
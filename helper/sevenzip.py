@@ -0,0 +1,66 @@
+"""
+Async 7z driver: runs `7z x` as an asyncio subprocess, parses its -bsp1
+progress output into the job, and enforces cancellation and time limits.
+"""
+import os
+import re
+import logging
+import tempfile
+
+from helper.driver import run_tool
+from helper.job import ExtractJob
+
+log = logging.getLogger(__name__)
+
+_PERCENT = re.compile(rb"(\d{1,3})%")
+_SPLIT   = re.compile(rb"[\r\n\b]+")
+
+
+def _parse_progress(buf: bytes, job: ExtractJob, total: int | None) -> bytes:
+    """
+    Consume complete progress records from buf and return the remainder.
+    7z redraws its progress line with backspaces, e.g. "\\b\\b\\b 42% 17 - name".
+    """
+    parts = _SPLIT.split(buf)
+    for part in parts[:-1]:
+        m = _PERCENT.search(part)
+        if m:
+            job.report_percent(min(int(m.group(1)), 100), total)
+    return parts[-1]
+
+
+async def run_7z(archive_path: str, dest_dir: str, members=None,
+                 job: ExtractJob | None = None, expected_size: int | None = None) -> None:
+    """
+    Extract with 7z without tying up a worker thread.
+
+    `members` restricts extraction to those names. `expected_size` (from
+    the archive listing) is checked against the job's output limits before
+    7z starts; 7z writes exactly the sizes recorded in the headers, and its
+    percentage is turned into bytes against that size. Without a listing
+    the output directory is measured while 7z runs instead.
+
+    Raises:
+        JobCancelled: If the job was cancelled.
+        OutputLimitExceeded: If the output goes over the job's limits.
+        RuntimeError: On timeout or a 7z failure.
+    """
+    job = job or ExtractJob()
+    cmd = ["7z", "x", archive_path, f"-o{dest_dir}", "-y", "-bsp1", "-bso0"]
+    listfile = None
+    if members is not None:
+        # Pass names through a UTF-8 list file with wildcards disabled so
+        # long selections and names containing '*' or '?' survive intact.
+        fd, listfile = tempfile.mkstemp(suffix=".lst")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(members))
+        cmd += ["-spd", "-scsUTF-8", f"@{listfile}"]
+
+    try:
+        returncode, stderr = await run_tool(cmd, dest_dir, job, _parse_progress, expected_size)
+        if returncode != 0:
+            raise RuntimeError(f"7z extraction failed: {stderr}")
+        job.report_percent(100, expected_size)
+    finally:
+        if listfile:
+            os.remove(listfile)
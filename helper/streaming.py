@@ -0,0 +1,134 @@
+"""
+Stream archive members straight into an upload without writing them to disk.
+"""
+import io
+import os
+import queue
+import logging
+import zipfile
+import threading
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE  = 512 * 1024   # matches Pyrogram's upload part size
+QUEUE_DEPTH = 8            # chunks buffered ahead of the uploader (~4 MB)
+
+_EOF = object()
+
+
+class ZipMemberStream(io.RawIOBase):
+    """
+    Read-only file object over one ZIP member of an open (shareable)
+    ZipFile, typically ArchiveManifest.zip_file().
+
+    A background thread decompresses the member chunk by chunk into a
+    bounded queue, so memory use stays at QUEUE_DEPTH chunks regardless of
+    the member size. Pyrogram only needs the size up front and then reads
+    sequentially; any other seek raises io.UnsupportedOperation so the
+    caller can fall back to extracting the member to disk.
+    """
+
+    def __init__(self, zf: zipfile.ZipFile, member: str):
+        super().__init__()
+        info = zf.getinfo(member)
+        self.name  = os.path.basename(member)
+        self.size  = info.file_size
+        self._zf       = zf
+        self._member   = member
+        self._queue    = queue.Queue(maxsize=QUEUE_DEPTH)
+        self._stop     = threading.Event()
+        self._thread   = None
+        self._buf      = b""
+        self._consumed = 0   # bytes actually handed to the reader
+        self._pos      = 0   # position as reported by tell()
+
+    # ── Producer ──────────────────────────────────────────────────────────────
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            with self._zf.open(self._member) as src:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if not self._put(chunk):
+                        return
+            self._put(_EOF)
+        except Exception as e:
+            log.warning("Streaming '%s' failed: %s", self._member, e)
+            self._put(e)
+
+    # ── File object API ───────────────────────────────────────────────────────
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            target = offset
+        elif whence == io.SEEK_CUR:
+            target = self._pos + offset
+        elif whence == io.SEEK_END:
+            target = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+
+        # Size probes (seek to end, tell, seek back) are free; moving the
+        # read position once data has been consumed is not.
+        if self._consumed and target != self._consumed:
+            raise io.UnsupportedOperation("ZIP member stream is forward-only")
+        self._pos = target
+        return self._pos
+
+    def read(self, size: int = -1) -> bytes:
+        if self._pos != self._consumed:
+            raise io.UnsupportedOperation("ZIP member stream is forward-only")
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._produce, daemon=True)
+            self._thread.start()
+
+        # Pyrogram expects full-sized parts, so keep pulling until `size`
+        # bytes are available or the member is exhausted.
+        while size < 0 or len(self._buf) < size:
+            item = self._queue.get()
+            if item is _EOF:
+                self._queue.put(_EOF)
+                break
+            if isinstance(item, Exception):
+                raise RuntimeError(f"Could not read '{self._member}': {item}") from item
+            self._buf += item
+
+        if size < 0:
+            data, self._buf = self._buf, b""
+        else:
+            data, self._buf = self._buf[:size], self._buf[size:]
+        self._consumed += len(data)
+        self._pos = self._consumed
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._stop.set()
+        super().close()
+
+
+def can_stream(fmt: str) -> bool:
+    """Return True if members of this archive format can be streamed to the uploader."""
+    return fmt == "zip"
@@ -0,0 +1,100 @@
+"""
+Async unrar driver: extracts a whole RAR archive (or volume set) with one
+multithreaded `unrar x` process, parsing its per-file and percentage output
+into the job. Cancellation and limits are handled by helper.driver.
+"""
+import os
+import re
+import shutil
+import tempfile
+import functools
+import subprocess
+
+from helper.driver import run_tool
+from helper.job import ExtractJob
+
+_PERCENT = re.compile(rb"(\d{1,3})%\s*$")
+_DONE    = re.compile(rb"(?:^|\s)OK\s*$")
+_SPLIT   = re.compile(rb"[\r\n\b]+")
+
+
+@functools.lru_cache(maxsize=1)
+def available() -> bool:
+    """True if RARLAB's unrar is installed (unrar-free lacks -mt and RAR5)."""
+    path = shutil.which("unrar")
+    if path is None:
+        return False
+    try:
+        banner = subprocess.run([path], capture_output=True, timeout=10).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+    return b"Alexander Roshal" in banner
+
+
+class _Progress:
+    """
+    Parser for unrar's console output. Each file is printed as
+    "Extracting  <path>" followed by the archive percentage, redrawn with
+    backspaces ("\\b\\b\\b\\b 42%"), and "OK" once the file is complete.
+    """
+
+    def __init__(self):
+        self.files = 0   # files reported OK
+
+    def __call__(self, buf: bytes, job: ExtractJob, total: int | None) -> bytes:
+        parts = _SPLIT.split(buf)
+        for part in parts[:-1]:
+            if _DONE.search(part):
+                self.files += 1
+                job.add(members=1)
+                continue
+            m = _PERCENT.search(part)
+            if m:
+                percent = min(int(m.group(1)), 100)
+                if job.percent is None or percent > job.percent:
+                    job.report_percent(percent, total)
+        return parts[-1]
+
+
+async def run_unrar(archive_path: str, dest_dir: str, members=None,
+                    job: ExtractJob | None = None, expected_size: int | None = None,
+                    threads: int | None = None) -> int:
+    """
+    Extract with one `unrar x` run without tying up a worker thread.
+
+    `members` restricts extraction to those names; `expected_size` (from
+    the listing) turns unrar's percentage into bytes and is checked against
+    the job's limits up front. `threads` is passed as -mt. Returns how many
+    files unrar reported as extracted (already counted in the job).
+
+    Raises:
+        JobCancelled: If the job was cancelled.
+        OutputLimitExceeded: If the output goes over the job's limits.
+        RuntimeError: On timeout or an unrar failure.
+    """
+    job = job or ExtractJob()
+    # -idc: no banner, -o+: overwrite, -p-: never prompt for a password.
+    cmd = ["unrar", "x", "-idc", "-y", "-o+", "-p-"]
+    if threads:
+        cmd.append(f"-mt{threads}")
+    cmd.append(archive_path)
+
+    listfile = None
+    if members is not None:
+        fd, listfile = tempfile.mkstemp(suffix=".lst")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("\n".join(members))
+        cmd[2:2] = ["-scfl"]   # the list file is UTF-8
+        cmd.append(f"@{listfile}")
+    cmd.append(os.path.join(dest_dir, ""))
+
+    progress = _Progress()
+    try:
+        returncode, stderr = await run_tool(cmd, dest_dir, job, progress, expected_size)
+        if returncode != 0:
+            raise RuntimeError(f"unrar extraction failed: {stderr}")
+        job.report_percent(100, expected_size)
+    finally:
+        if listfile:
+            os.remove(listfile)
+    return progress.files
@@ -56,8 +56,18 @@ async def upload_file(
     user_id=None,     # ← accepted but intentionally unused (caller compat)
     **kwargs,         # ← absorbs any other unexpected keyword arguments
 ) -> None:
-    """Upload a single file, choosing the best available client."""
-    size   = os.path.getsize(file_path)
+    """
+    Upload a single file, choosing the best available client.
+
+    `file_path` may also be a readable file object exposing `.name` and
+    `.size` (e.g. a ZipMemberStream); it is handed to Pyrogram as-is.
+    """
+    if isinstance(file_path, str):
+        size = os.path.getsize(file_path)
+        name = file_path
+    else:
+        size = file_path.size
+        name = file_path.name
     TWO_GB = 2 * 1024 * 1024 * 1024
 
     # Use user client for files >2 GB if session string was provided
@@ -74,7 +84,7 @@ async def upload_file(
         and not os.path.isfile(str(thumb))
     )
 
-    media_type, _ = _guess_media_type(file_path)
+    media_type, _ = _guess_media_type(name)
     cb = make_progress(status_msg, "Uploading") if status_msg else None
 
     kwargs = dict(
@@ -0,0 +1,26 @@
+"""
+Path helpers shared by the extraction engines.
+"""
+import os
+import re
+
+_DRIVE = re.compile(r"^[A-Za-z]:")
+
+
+def safe_join(dest_dir: str, name: str) -> str:
+    """
+    Path of archive member `name` under dest_dir, blocking path traversal
+    (zip slip).
+
+    Names are checked lexically: absolute paths, drive letters and '..'
+    parts are rejected, with '\\' treated as a separator too. Nothing is
+    resolved against the filesystem; callers that write symlinks check
+    those themselves.
+    """
+    if (
+        name.startswith(("/", "\\"))
+        or _DRIVE.match(name)
+        or ".." in name.replace("\\", "/").split("/")
+    ):
+        raise RuntimeError(f"Path traversal attempt blocked: {name}")
+    return os.path.normpath(os.path.join(dest_dir, name))
@@ -0,0 +1,219 @@
+"""
+Split and multi-volume archive sets.
+
+Supported naming schemes:
+    name.zip.001, name.zip.002, ...     (byte-split ZIP)
+    name.7z.001,  name.7z.002,  ...     (byte-split 7z, read natively by 7z)
+    name.part1.rar, name.part2.rar, ... (RAR volumes, read natively by unrar / 7z)
+
+The parts are kept side by side under their original names and an archive
+set is always addressed by the path of its first part. Split ZIPs are read
+through ConcatFile, a virtual concatenation, so no joined copy is written.
+"""
+import io
+import os
+import re
+import bisect
+import zipfile
+from typing import NamedTuple
+
+_SPLIT_RE = re.compile(r"^(?P<base>.+\.(?P<fmt>zip|7z))\.(?P<num>\d{3})$", re.IGNORECASE)
+_RAR_RE   = re.compile(r"^(?P<base>.+)\.part(?P<num>\d+)\.rar$", re.IGNORECASE)
+
+
+class VolumeName(NamedTuple):
+    base: str      # name of the set, e.g. "photos.zip" or "photos.rar"
+    fmt: str       # "zip", "7z" or "rar"
+    index: int     # 1-based part number
+    width: int     # digits in the part number, for building sibling names
+
+
+def volume_info(filename: str) -> VolumeName | None:
+    """Parse a volume filename, or None if it is not part of a set."""
+    name = os.path.basename(filename)
+    m = _SPLIT_RE.match(name)
+    if m:
+        return VolumeName(m["base"], m["fmt"].lower(), int(m["num"]), len(m["num"]))
+    m = _RAR_RE.match(name)
+    if m:
+        return VolumeName(m["base"] + ".rar", "rar", int(m["num"]), len(m["num"]))
+    return None
+
+
+def volume_filename(vol: VolumeName, index: int) -> str:
+    """Filename of part `index` of the set `vol` belongs to."""
+    num = str(index).zfill(vol.width)
+    if vol.fmt == "rar":
+        return f"{vol.base[:-len('.rar')]}.part{num}.rar"
+    return f"{vol.base}.{num}"
+
+
+def volume_paths(path: str) -> list:
+    """
+    All parts of the set `path` belongs to that are on disk, in order and
+    contiguous from part 1; [path] for a regular archive.
+    """
+    vol = volume_info(path)
+    if vol is None:
+        return [path]
+    folder = os.path.dirname(path)
+    paths  = []
+    index  = 1
+    while True:
+        part = os.path.join(folder, volume_filename(vol, index))
+        if not os.path.isfile(part):
+            return paths
+        paths.append(part)
+        index += 1
+
+
+def remove_archive(path: str) -> None:
+    """Delete an archive, or every part of a volume set."""
+    for part in volume_paths(path) or [path]:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+
+
+def _tail(paths: list, size: int) -> bytes:
+    """Last `size` bytes of the concatenated parts."""
+    with ConcatFile(paths) as f:
+        f.seek(max(f.size - size, 0))
+        return f.read()
+
+
+def set_complete(paths: list, fmt: str) -> bool | None:
+    """
+    Tell from the parts received so far (contiguous from part 1) whether the
+    set is whole: True / False, or None when the format doesn't say.
+    """
+    if not paths:
+        return False
+    total = sum(os.path.getsize(p) for p in paths)
+
+    if fmt == "7z":
+        # Start header: signature, version, CRC, then next-header offset
+        # and size relative to the end of the 32-byte header.
+        with open(paths[0], "rb") as f:
+            head = f.read(32)
+        if len(head) < 32:
+            return False
+        offset = int.from_bytes(head[12:20], "little")
+        length = int.from_bytes(head[20:28], "little")
+        return total >= 32 + offset + length
+
+    if fmt == "zip":
+        # The end-of-central-directory record, plus its comment, ends the set.
+        tail = _tail(paths, 22 + 0xFFFF)
+        pos  = tail.rfind(b"PK\x05\x06")
+        if pos < 0 or pos + 22 > len(tail):
+            return False
+        comment = int.from_bytes(tail[pos + 20:pos + 22], "little")
+        return pos + 22 + comment == len(tail)
+
+    if fmt == "rar":
+        # RAR5 end-of-archive header: CRC32, size 3, type 5, header flags,
+        # archive flags (bit 0: another volume follows).
+        tail = _tail(paths[-1:], 8)
+        if len(tail) == 8 and tail[4] == 3 and tail[5] == 5:
+            return not tail[7] & 1
+        return None
+
+    return None
+
+
+class ConcatFile(io.RawIOBase):
+    """Read-only, seekable view of several files as if they were one."""
+
+    def __init__(self, paths: list):
+        super().__init__()
+        self.name    = paths[0]
+        self._paths  = paths
+        self._starts = []
+        offset = 0
+        for p in paths:
+            self._starts.append(offset)
+            offset += os.path.getsize(p)
+        self.size    = offset
+        self._pos    = 0
+        self._files  = {}   # part index → open handle
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if self._pos < 0:
+            raise ValueError("Negative seek position")
+        return self._pos
+
+    def _part(self, i: int):
+        fh = self._files.get(i)
+        if fh is None:
+            fh = self._files[i] = open(self._paths[i], "rb")
+        return fh
+
+    def readinto(self, b) -> int:
+        if self._pos >= self.size:
+            return 0
+        i    = bisect.bisect_right(self._starts, self._pos) - 1
+        end  = self._starts[i + 1] if i + 1 < len(self._starts) else self.size
+        view = memoryview(b)[:end - self._pos]
+        fh   = self._part(i)
+        fh.seek(self._pos - self._starts[i])
+        n = fh.readinto(view)
+        self._pos += n
+        return n
+
+    def read(self, size: int = -1) -> bytes:
+        # Unlike a raw read, never return short across a part boundary:
+        # zipfile treats a short header read as a truncated archive.
+        if size is None or size < 0:
+            size = max(self.size - self._pos, 0)
+        buf  = bytearray(size)
+        view = memoryview(buf)
+        got  = 0
+        while got < size:
+            n = self.readinto(view[got:])
+            if not n:
+                break
+            got += n
+        return bytes(buf[:got])
+
+    def close(self):
+        for fh in self._files.values():
+            fh.close()
+        self._files.clear()
+        super().close()
+
+
+class _VolumeZipFile(zipfile.ZipFile):
+    """ZipFile over a ConcatFile that closes the parts with the archive."""
+
+    def close(self):
+        fp = self.fp
+        super().close()
+        if fp is not None:
+            fp.close()
+
+
+def open_zip(path: str) -> zipfile.ZipFile:
+    """Open a ZIP archive, or the first part of a split ZIP set."""
+    vol = volume_info(path)
+    if vol is None or vol.fmt != "zip":
+        return zipfile.ZipFile(path, "r")
+    return _VolumeZipFile(ConcatFile(volume_paths(path)), "r")
@@ -0,0 +1,105 @@
+"""
+Disk writes off the event loop.
+
+A slow or busy disk can block a write() for tens of milliseconds, and on
+the event loop that stalls every other handler (progress edits, button
+presses, other users' downloads). FileWriter hands chunks to a dedicated
+thread through a bounded queue: the loop only waits when the disk falls a
+whole queue behind, and then without blocking.
+"""
+import os
+import queue
+import asyncio
+import threading
+
+QUEUE_DEPTH = 32   # chunks buffered ahead of the disk (8 MB of 256 KB chunks)
+
+_CLOSE = object()
+
+
+class FileWriter:
+    """
+    Write chunks to the file at `path` (opened with `flags`) from a
+    background thread. write() appends, or writes at `offset` (pwrite), in
+    the order called; flush() waits until everything written before it is
+    on disk; close() does that and closes the file. A failed write is
+    raised from the next write(), flush() or close().
+    """
+
+    def __init__(self, path: str, flags: int = os.O_WRONLY, depth: int = QUEUE_DEPTH):
+        self._fd     = os.open(path, flags, 0o644)
+        self._loop   = asyncio.get_running_loop()
+        self._slots  = asyncio.Semaphore(depth)
+        self._queue  = queue.Queue()
+        self._error  = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="file-writer", daemon=True)
+        self._thread.start()
+
+    # ── Writer thread ─────────────────────────────────────────────────────────
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _CLOSE:
+                break
+            if isinstance(item, asyncio.Future):   # flush marker
+                self._loop.call_soon_threadsafe(_resolve, item)
+                continue
+            data, offset = item
+            if self._error is None:
+                try:
+                    if offset is None:
+                        _write_all(self._fd, data)
+                    else:
+                        _pwrite_all(self._fd, data, offset)
+                except OSError as e:
+                    self._error = e
+            self._loop.call_soon_threadsafe(self._slots.release)
+        os.close(self._fd)
+
+    # ── Event loop side ───────────────────────────────────────────────────────
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    async def write(self, data: bytes, offset: int | None = None):
+        # Queued at once, in call order, so a flush() issued after this
+        # call covers it; waiting for room comes after. The queue can run
+        # over `depth` by one chunk per concurrent writer.
+        self._check()
+        self._queue.put((data, offset))
+        await self._slots.acquire()
+
+    async def flush(self):
+        marker = self._loop.create_future()
+        self._queue.put(marker)
+        await marker
+        self._check()
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.flush()
+        finally:
+            self._queue.put(_CLOSE)
+            await self._loop.run_in_executor(None, self._thread.join)
+
+
+def _resolve(fut: asyncio.Future):
+    if not fut.done():
+        fut.set_result(None)
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int):
+    view = memoryview(data)
+    while view:
+        n = os.pwrite(fd, view, offset)
+        view, offset = view[n:], offset + n
@@ -32,6 +32,8 @@ async def _settings_keyboard(uid: int) -> InlineKeyboardMarkup:
                               callback_data="toggle_screenshots")],
         [InlineKeyboardButton(f"🤖 Bot Updates — {_on_off(u.get('bot_updates', True))}",
                               callback_data="toggle_updates")],
+        [InlineKeyboardButton(f"🗂️ Extract Nested Archives — {_on_off(u.get('nested', False))}",
+                              callback_data="toggle_nested")],
         [
             InlineKeyboardButton("🖼️ See Thumbnail",    callback_data="see_thumb"),
             InlineKeyboardButton("🗑️ Delete Thumbnail", callback_data="del_thumb"),
@@ -86,6 +88,9 @@ async def toggle_screenshots(c, q): await _toggle_and_refresh(c, q, "screenshots
 @Client.on_callback_query(filters.regex("^toggle_updates$"))
 async def toggle_updates(c, q): await _toggle_and_refresh(c, q, "bot_updates")
 
+@Client.on_callback_query(filters.regex("^toggle_nested$"))
+async def toggle_nested(c, q): await _toggle_and_refresh(c, q, "nested")
+
 
 # ── Thumbnail ────────────────────────────────────────────────────────────────
 _waiting_thumb: set = set()
@@ -1,9 +1,11 @@
 """
 Core unzip plugin with auto-filter (inline file selection after extraction).
 """
+import io
 import os
 import shutil
 import asyncio
+import tempfile
 import logging
 import time
 from pyrogram import Client, filters
@@ -14,15 +16,28 @@ from pyrogram.types import (
 from config import Config
 from database import db
 from script import script
-from utils import get_readable_file_size, check_force_sub, temp
-from helper.extractor import extract_archive, is_archive
+from utils import DownloadTooLarge, get_readable_file_size, check_force_sub, temp
+from helper.extractor import (
+    archive_format, extract_archive, extract_archive_async, is_archive, list_archive,
+)
+from helper.job import ExtractJob, JobCancelled, OutputLimitExceeded
+from helper.formats import COMPRESSIONS, format_from_name, sniff_format, ARCHIVE_MIME_TYPES
+from helper.manifest import ArchiveManifest
 from helper.uploader import upload_file
+from helper.utils import safe_join
+from helper.streaming import ZipMemberStream, can_stream
+from helper.volumes import VolumeName, volume_info, remove_archive, set_complete
+from helper.memory import MemoryArchive, budget as memory_budget, fits_in_memory
+from helper.pipeline import PIPE_FORMATS, extract_download, sniff_stream, spool
+from helper.remote_zip import RemoteZip
 from helper.progress import make_progress
 
 log = logging.getLogger(__name__)
 
 # In-memory state: user_id → extraction session
-_sessions: dict = {}   # user_id → {"files": [...], "dest": str, "selected": set}
+_sessions: dict = {}   # user_id → {"archive": str, "memory": MemoryArchive, "remote": RemoteZip, "manifest": ArchiveManifest, "dest": str, "selected": set}
+_jobs: dict = {}       # (user_id, status message id) → ExtractJob running under that message
+_volume_sets: dict = {}   # user_id → {"base", "fmt", "parts": {index: path}, "size", "msg", "status"}
 
 FORCE_CHANNELS = Config.FORCE_SUB_CHANNELS
 
@@ -30,24 +45,32 @@ FORCE_CHANNELS = Config.FORCE_SUB_CHANNELS
 # ──────────────────────────────────────────────────────────────────────────────
 # Helper: check limit
 # ──────────────────────────────────────────────────────────────────────────────
+async def _size_limit(uid: int) -> int:
+    premium = await db.is_premium(uid) or uid == Config.OWNER_ID
+    return Config.PREMIUM_LIMIT if premium else Config.FREE_LIMIT
+
+
 async def _check_limit(client, message: Message, file_size: int) -> bool:
-    uid      = message.from_user.id
-    premium  = await db.is_premium(uid) or uid == Config.OWNER_ID
-    limit    = Config.PREMIUM_LIMIT if premium else Config.FREE_LIMIT
+    limit = await _size_limit(message.from_user.id)
     if file_size > limit:
-        label = get_readable_file_size(limit)
-        await message.reply_text(
-            f"❌ File too large!\n"
-            f"{'💎 Premium' if premium else '🆓 Free'} limit: **{label}**\n"
-            f"{'Upgrade to Premium for 4 GB!' if not premium else ''}",
-            reply_markup=InlineKeyboardMarkup([[
-                InlineKeyboardButton("💎 Get Premium", callback_data="premium_info")
-            ]]) if not premium else None
-        )
+        await _reply_too_large(message, limit)
         return False
     return True
 
 
+async def _reply_too_large(message: Message, limit: int):
+    premium = limit == Config.PREMIUM_LIMIT
+    label   = get_readable_file_size(limit)
+    await message.reply_text(
+        f"❌ File too large!\n"
+        f"{'💎 Premium' if premium else '🆓 Free'} limit: **{label}**\n"
+        f"{'Upgrade to Premium for 4 GB!' if not premium else ''}",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("💎 Get Premium", callback_data="premium_info")
+        ]]) if not premium else None
+    )
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Guard: force-sub
 # ──────────────────────────────────────────────────────────────────────────────
@@ -72,12 +95,28 @@ async def _guard(client, message: Message) -> bool:
 # ──────────────────────────────────────────────────────────────────────────────
 # Rename helper
 # ──────────────────────────────────────────────────────────────────────────────
-_rename_pending: dict = {}   # user_id → {"msg_id": int, "path": str, "action": str}
+_rename_pending: dict = {}   # user_id → {"path": str | MemoryArchive, "action": str, "task": Task, ...}
 
 
-async def _ask_rename(client: Client, message: Message, path: str, action: str):
+async def _ask_rename(client: Client, message: Message, path, action: str,
+                      status=None, task=None):
+    """
+    Ask for a new filename. For archives the listing (or up-front
+    extraction) starts right away on `status`, so the selection keyboard is
+    ready by the time the user answers; the rename is applied afterwards.
+    `task` is that work when the caller already started it (pipeline mode).
+    """
     uid = message.from_user.id
-    _rename_pending[uid] = {"path": path, "action": action, "orig_msg": message, "prompt_id": None}
+    old = _rename_pending.pop(uid, None)
+    if old:
+        _discard_pending(old)   # superseded before the user answered
+    if task is None and action == "unzip":
+        await status.edit("🔎 Reading archive...")
+        task = asyncio.create_task(_read_archive(message, status, path))
+    _rename_pending[uid] = {
+        "path": path, "action": action, "orig_msg": message, "prompt_id": None,
+        "status": status, "task": task,
+    }
     sent = await message.reply_text(
         script.RENAME_TXT,
         reply_markup=InlineKeyboardMarkup([[
@@ -97,7 +136,7 @@ async def skip_rename_cb(client: Client, query: CallbackQuery):
     data = _rename_pending.pop(uid, None)
     if data:
         await query.message.delete()
-        await _process_archive(client, data["orig_msg"], data["path"])
+        await _finish_rename(client, data, None)
 
 
 @Client.on_message(filters.private & filters.text & ~filters.command("start"))
@@ -110,19 +149,77 @@ async def rename_reply_handler(client: Client, message: Message):
     if new_name.lower() == "/skip":
         new_name = None
 
-    path = data["path"]
-    if new_name:
-        ext      = os.path.splitext(path)[1]
-        new_path = os.path.join(os.path.dirname(path), new_name + ext)
-        os.rename(path, new_path)
-        path = new_path
-
     try:
         if data.get("prompt_id"):
             await client.delete_messages(message.chat.id, data["prompt_id"])
     except Exception:
         pass
-    await _process_archive(client, data["orig_msg"], path)
+    await _finish_rename(client, data, new_name)
+
+
+async def _finish_rename(client: Client, data: dict, new_name: str | None):
+    """Carry on with a file once its rename prompt is answered or skipped."""
+    task = data.get("task")
+    if task is None:
+        path = _renamed(data["path"], new_name) if new_name else data["path"]
+        await _process_archive(client, data["orig_msg"], path)
+        return
+
+    prepared = await task
+    if prepared is None:
+        return   # the error is already on the status message
+    if new_name:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, _rename_prepared, prepared, new_name)
+    await _open_session(data["orig_msg"], data["status"], prepared)
+
+
+def _renamed(path, new_name: str):
+    """Rename a downloaded file (on disk or in memory), keeping its extension."""
+    if isinstance(path, MemoryArchive):
+        path.name = new_name + os.path.splitext(path.name)[1]
+        return path
+    ext      = os.path.splitext(path)[1]
+    new_path = os.path.join(os.path.dirname(path), new_name + ext)
+    os.rename(path, new_path)
+    return new_path
+
+
+def _rename_prepared(prepared: dict, new_name: str):
+    """
+    Rename an archive _read_archive has already read. The manifest follows
+    the file; a bare stream is listed again, as its member is named after it.
+    """
+    manifest = prepared["manifest"]
+    if prepared["memory"]:
+        manifest.path = _renamed(prepared["memory"], new_name).name
+    elif prepared["archive"]:
+        path = _renamed(prepared["archive"], new_name)
+        prepared["archive"] = manifest.path = path
+        if manifest.fmt in COMPRESSIONS:
+            manifest.close()
+            prepared["manifest"] = list_archive(path, manifest.fmt)
+
+
+def _discard_pending(data: dict):
+    """Free what an unanswered rename prompt holds, once its reading is done."""
+    task = data.get("task")
+    if task is None:
+        if isinstance(data["path"], MemoryArchive):
+            data["path"].close()
+        return
+
+    def _drop(t):
+        if t.cancelled() or t.exception() or not t.result():
+            return
+        prepared = t.result()
+        prepared["manifest"].close()
+        if prepared["memory"]:
+            prepared["memory"].close()
+        if prepared["archive"]:
+            remove_archive(prepared["archive"])
+        shutil.rmtree(prepared["dest"], ignore_errors=True)
+    task.add_done_callback(_drop)
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -137,11 +234,21 @@ async def file_received(client: Client, message: Message):
     doc  = message.document or message.video or message.audio
     fname = (doc.file_name or "file") if doc else "file"
     fsize = doc.file_size if doc else 0
+    mime  = (doc.mime_type or "") if doc else ""
+
+    # Parts of a split set are collected until the set is whole.
+    vol = volume_info(fname)
+    if vol:
+        await _collect_volume(client, message, vol, fname, fsize)
+        return
 
-    if not is_archive(fname):
+    # Renamed / extension-less archives are let through on their MIME type;
+    # the magic bytes decide once the file is on disk.
+    if not is_archive(fname) and mime not in ARCHIVE_MIME_TYPES:
         await message.reply_text(
             "📦 This doesn't look like a supported archive.\n"
-            "Supported: ZIP, RAR, 7Z, TAR, TAR.GZ, TAR.BZ2, TAR.XZ"
+            "Supported: ZIP, RAR, 7Z, TAR, TAR.GZ, TAR.BZ2, TAR.XZ, TAR.ZST, TAR.LZ4, ZST, LZ4\n"
+            "Split sets: .zip.001, .7z.001, .part1.rar"
         )
         return
 
@@ -154,30 +261,303 @@ async def file_received(client: Client, message: Message):
 
     # Rename option
     u_data = await db.get_user(uid)
-    if u_data and u_data.get("rename", True):
-        dest = os.path.join(Config.DOWNLOAD_DIR, str(uid), fname)
-        os.makedirs(os.path.dirname(dest), exist_ok=True)
+    rename = bool(u_data and u_data.get("rename", True))
+
+    # Tarballs too big for memory are extracted while they download.
+    if _can_pipeline(format_from_name(fname), u_data) and not fits_in_memory(fname, fsize):
+        status = await message.reply_text("⬇️ Downloading & extracting...")
+        task   = asyncio.create_task(_pipeline_archive(
+            message, status, fname, fsize, client.stream_media(message),
+        ))
+        if rename:
+            await _ask_rename(client, message, None, "unzip", status, task)
+        else:
+            prepared = await task
+            if prepared:
+                await _open_session(message, status, prepared)
+        return
+
+    if rename:
         status = await message.reply_text("⏳ Waiting for new filename...")
-        # Download first then ask rename
+        # Download first, then read the archive while asking for a name
         await status.edit("⬇️ Downloading...")
-        local = await client.download_media(
-            message,
-            file_name=dest,
-            progress=make_progress(status, "Download", user_name, user_id),
-        )
-        await status.delete()
-        await _ask_rename(client, message, local, "unzip")
+        local = await _download(client, message, fname, fsize, status, user_name, user_id)
+        await _ask_rename(client, message, local, "unzip", status)
     else:
         status = await message.reply_text("⬇️ Downloading...")
-        dest   = os.path.join(Config.DOWNLOAD_DIR, str(uid), fname)
-        os.makedirs(os.path.dirname(dest), exist_ok=True)
-        local  = await client.download_media(
+        local  = await _download(client, message, fname, fsize, status, user_name, user_id)
+        await status.delete()
+        await _process_archive(client, message, local)
+
+
+def _can_pipeline(fmt: str | None, u_data: dict | None) -> bool:
+    """Whether a download in format `fmt` can go through pipeline mode."""
+    # Nested archives are unpacked from an archive on disk.
+    return bool(
+        Config.PIPELINE_TARBALLS
+        and fmt in PIPE_FORMATS
+        and not (u_data and u_data.get("nested", False))
+    )
+
+
+async def _pipeline_archive(message: Message, status, fname: str, fsize: int,
+                            chunks) -> dict | None:
+    """
+    Extract a tarball while `chunks` (its download) arrive, then return the
+    session fields like _read_archive, or None once an error is shown.
+    If the first bytes turn out not to be a tarball, the download is
+    finished to disk and read the usual way.
+    """
+    uid       = message.from_user.id
+    user_name = message.from_user.first_name or "User"
+    user_dir, dest_dir = _job_dirs(uid)
+
+    path = None
+    try:
+        fmt, chunks = await sniff_stream(chunks, fname)
+        if fmt not in PIPE_FORMATS:
+            os.rmdir(dest_dir)   # _read_archive makes its own
+            path = await spool(
+                chunks, os.path.join(user_dir, fname),
+                make_progress(status, "Download", user_name, uid), fsize,
+            )
+            return await _read_archive(message, status, path)
+        files = await _run_extraction(
+            status, None, dest_dir, None, None, user_name, uid, fmt=fmt,
+            chunks=chunks, input_size=fsize,
+        )
+    except DownloadTooLarge as e:
+        # A URL without a length up front, cut off at the user's limit
+        await status.delete()
+        await _reply_too_large(message, e.limit)
+        _cleanup_session({"dest": dest_dir, "archive": path})
+        return None
+    except Exception as e:
+        await status.edit(_extraction_error(e))
+        _cleanup_session({"dest": dest_dir, "archive": path})
+        return None
+
+    manifest = ArchiveManifest.from_files(dest_dir, fmt, files)
+    if not manifest.entries:
+        await status.edit("❌ Archive is empty or extraction failed.")
+        _cleanup_session({"dest": dest_dir})
+        return None
+    return {"archive": None, "memory": None, "manifest": manifest, "dest": dest_dir}
+
+
+def _can_remote_zip(fmt: str | None, u_data: dict | None) -> bool:
+    """Whether a URL in format `fmt` can be read through Range requests."""
+    return bool(
+        Config.REMOTE_ZIP
+        and fmt == "zip"
+        and not (u_data and u_data.get("nested", False))
+    )
+
+
+async def _remote_archive(message: Message, status, url: str, fname: str):
+    """
+    List a ZIP at `url` (saved as `fname`) from its central directory
+    alone. Returns the session fields, None once an error is shown on
+    `status`, or False if the server can't serve byte ranges (the caller
+    downloads the whole file).
+    """
+    uid      = message.from_user.id
+    user_dir = os.path.join(Config.DOWNLOAD_DIR, str(uid))
+    os.makedirs(user_dir, exist_ok=True)
+
+    await status.edit("🔎 Reading remote archive...")
+    try:
+        remote = await RemoteZip.open(url, os.path.join(user_dir, fname))
+    except Exception as e:
+        log.info("Range listing of %s failed, downloading it: %s", url, e)
+        return False
+    if remote is None:
+        return False
+    _, dest_dir = _job_dirs(uid)
+
+    loop = asyncio.get_event_loop()
+    try:
+        manifest = await loop.run_in_executor(None, list_archive, remote.path, "zip")
+    except Exception as e:
+        await status.edit(f"❌ Extraction failed!\n`{e}`")
+        _cleanup_session({"dest": dest_dir, "archive": remote.path})
+        return None
+    if not manifest.entries:
+        await status.edit("❌ Archive is empty or extraction failed.")
+        _cleanup_session({"dest": dest_dir, "archive": remote.path, "manifest": manifest})
+        return None
+    return {
+        "archive": remote.path, "memory": None, "remote": remote,
+        "manifest": manifest, "dest": dest_dir,
+    }
+
+
+async def _download(client: Client, message: Message, fname: str, fsize: int,
+                    status, user_name: str, user_id: int):
+    """
+    Download an archive into RAM when it qualifies for the in-memory fast
+    path and the memory budget has room, otherwise under DOWNLOAD_DIR.
+    Returns a MemoryArchive or the local path.
+    """
+    progress = make_progress(status, "Download", user_name, user_id)
+    if fits_in_memory(fname, fsize) and memory_budget.reserve(fsize):
+        try:
+            buf = await client.download_media(
+                message, in_memory=True, file_name=fname, progress=progress,
+            )
+        except BaseException:
+            memory_budget.release(fsize)
+            raise
+        return MemoryArchive(buf, fsize)
+
+    dest = os.path.join(Config.DOWNLOAD_DIR, str(user_id), fname)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    return await client.download_media(message, file_name=dest, progress=progress)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Split / multi-volume sets
+# ──────────────────────────────────────────────────────────────────────────────
+def _volume_keyboard(uid: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("📦 Extract now", callback_data=f"vol_go#{uid}"),
+        InlineKeyboardButton("🗑️ Cancel",      callback_data=f"vol_cancel#{uid}"),
+    ]])
+
+
+def _volume_chain(vset: dict) -> list:
+    """Paths of the parts received so far, contiguous from part 1."""
+    paths, index = [], 1
+    while index in vset["parts"]:
+        paths.append(vset["parts"][index])
+        index += 1
+    return paths
+
+
+def _drop_volume_set(vset: dict):
+    for path in vset["parts"].values():
+        try:
+            os.remove(path)
+        except Exception:
+            pass
+
+
+async def _collect_volume(client: Client, message: Message, vol: VolumeName,
+                          fname: str, fsize: int):
+    """
+    Download one part of a split set next to its siblings under its own
+    name, so 7z / unrar find the volumes natively and split ZIPs can be read
+    as one virtual file. Extraction starts once the set is complete.
+    """
+    uid       = message.from_user.id
+    user_name = message.from_user.first_name or "User"
+
+    vset = _volume_sets.get(uid)
+    if vset and vset["base"] != vol.base:
+        # A different set replaces the unfinished one.
+        _drop_volume_set(_volume_sets.pop(uid))
+        vset = None
+    if vset is None:
+        vset = {"base": vol.base, "fmt": vol.fmt, "parts": {}, "size": 0,
+                "msg": message, "status": None}
+        _volume_sets[uid] = vset
+
+    if vol.index in vset["parts"]:
+        await message.reply_text(f"ℹ️ Part {vol.index} of `{vol.base}` is already here.")
+        return
+    # The whole set counts against the size limit.
+    if not await _check_limit(client, message, vset["size"] + fsize):
+        return
+    vset["size"] += fsize
+
+    status = await message.reply_text(f"⬇️ Downloading part {vol.index}...")
+    dest   = os.path.join(Config.DOWNLOAD_DIR, str(uid), fname)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        local = await client.download_media(
             message,
             file_name=dest,
-            progress=make_progress(status, "Download", user_name, user_id),
+            progress=make_progress(status, "Download", user_name, uid),
         )
-        await status.delete()
-        await _process_archive(client, message, local)
+    except Exception as e:
+        vset["size"] -= fsize
+        await status.edit(f"❌ Download failed!\n`{e}`")
+        return
+    await status.delete()
+
+    if _volume_sets.get(uid) is not vset:
+        # Cancelled or replaced while this part was downloading.
+        try:
+            os.remove(local)
+        except Exception:
+            pass
+        return
+    vset["parts"][vol.index] = local
+
+    chain = _volume_chain(vset)
+    loop  = asyncio.get_event_loop()
+    complete = bool(chain) and await loop.run_in_executor(
+        None, set_complete, chain, vset["fmt"]
+    )
+    if complete:
+        await _start_volume_set(client, uid, vset)
+        return
+
+    missing = [i for i in range(1, max(vset["parts"]) + 1) if i not in vset["parts"]]
+    text = (
+        f"🧩 **{vset['base']}**\n"
+        f"Received {len(vset['parts'])} part(s), "
+        f"{get_readable_file_size(vset['size'])}.\n"
+    )
+    if missing:
+        text += f"Missing: {', '.join(map(str, missing))}\n"
+    text += "Send the remaining parts, or tap Extract once all are in."
+    if vset["status"]:
+        try:
+            await vset["status"].delete()
+        except Exception:
+            pass
+    vset["status"] = await message.reply_text(text, reply_markup=_volume_keyboard(uid))
+
+
+async def _start_volume_set(client: Client, uid: int, vset: dict):
+    _volume_sets.pop(uid, None)
+    if vset["status"]:
+        try:
+            await vset["status"].delete()
+        except Exception:
+            pass
+    await _process_archive(client, vset["msg"], _volume_chain(vset)[0])
+
+
+@Client.on_callback_query(filters.regex(r"^vol_go#"))
+async def volume_go_cb(client: Client, query: CallbackQuery):
+    uid = int(query.data.split("#")[1])
+    if query.from_user.id != uid:
+        return
+    vset = _volume_sets.get(uid)
+    if not vset:
+        return await query.answer("Nothing to extract.", show_alert=True)
+    chain = _volume_chain(vset)
+    if not chain:
+        return await query.answer("Part 1 is missing.", show_alert=True)
+    loop = asyncio.get_event_loop()
+    if await loop.run_in_executor(None, set_complete, chain, vset["fmt"]) is False:
+        return await query.answer(
+            "The set is incomplete — send the remaining parts.", show_alert=True
+        )
+    await _start_volume_set(client, uid, vset)
+
+
+@Client.on_callback_query(filters.regex(r"^vol_cancel#"))
+async def volume_cancel_cb(client: Client, query: CallbackQuery):
+    uid = int(query.data.split("#")[1])
+    if query.from_user.id != uid:
+        return
+    vset = _volume_sets.pop(uid, None)
+    if vset:
+        _drop_volume_set(vset)
+    await query.message.edit("🗑️ Split archive discarded.")
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -197,163 +577,286 @@ def create_progress_bar(current: int, total: int, length: int = 12) -> str:
 # Extraction helpers with progress bar
 # ──────────────────────────────────────────────────────────────────────────────
 
-async def _get_total_uncompressed(archive_path: str):
-    """Try to obtain total uncompressed size of all files inside the archive."""
-    ext = os.path.splitext(archive_path)[1].lower()
-    total = None
-    try:
-        if ext == '.zip':
-            import zipfile
-            with zipfile.ZipFile(archive_path, 'r') as z:
-                total = sum(f.file_size for f in z.infolist())
-        elif ext in ('.rar', '.cbr'):
-            import rarfile
-            with rarfile.RarFile(archive_path, 'r') as r:
-                total = sum(f.file_size for f in r.infolist())
-        elif ext in ('.7z', '.cb7'):
-            import py7zr
-            with py7zr.SevenZipFile(archive_path, 'r') as sz:
-                total = sum(f.uncompressed for f in sz.list())
-        elif ext in ('.tar', '.tgz', '.tar.gz', '.tbz2', '.tar.bz2', '.txz', '.tar.xz'):
-            import tarfile
-            with tarfile.open(archive_path, 'r') as tar:
-                total = sum(f.size for f in tar.getmembers() if f.isfile())
-    except Exception as e:
-        log.debug(f"Could not get uncompressed size: {e}")
-    return total
+def _cancel_keyboard(uid: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("✖️ Cancel", callback_data=f"cancel_job#{uid}")
+    ]])
 
 
-def _extract_sync(archive_path: str, dest_dir: str):
-    """Synchronous extraction that works with both async and sync extractors."""
-    try:
-        import asyncio
-        from helper.extractor import extract_archive as async_extract
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(async_extract(archive_path, dest_dir))
-        loop.close()
-        return result
-    except Exception:
-        return extract_archive(archive_path, dest_dir)
-
-
-async def _process_archive(client: Client, message: Message, archive_path: str):
-    uid = message.from_user.id
-    user_name = message.from_user.first_name or "User"
-    
-    status = await message.reply_text("📦 Extracting archive...")
-    dest_dir = os.path.join(Config.DOWNLOAD_DIR, str(uid), "extracted")
-    os.makedirs(dest_dir, exist_ok=True)
-
-    # Try to get total size
-    total_size = await _get_total_uncompressed(archive_path)
-
+async def _extraction_progress(status, total_size, user_name: str, uid: int,
+                               job: ExtractJob):
+    """Periodically update extraction progress from the job's counters."""
     start_time = time.time()
-    last_update = [0]  # Use list to allow modification in nested function
-
-    async def update_progress():
-        """Periodically update extraction progress."""
-        while True:
-            await asyncio.sleep(2)  # Update every 2 seconds
-            elapsed = time.time() - start_time
-            
-            # Get current extracted size
-            try:
-                current_size = sum(
-                    os.path.getsize(os.path.join(root, f))
-                    for root, _, files in os.walk(dest_dir)
-                    for f in files
-                )
-            except Exception:
-                current_size = 0
+    while True:
+        await asyncio.sleep(2)  # Update every 2 seconds
+        elapsed = time.time() - start_time
 
-            if total_size and total_size > 0:
-                percent = min((current_size * 100) / total_size, 99.9)
-                bar = create_progress_bar(current_size, total_size, length=12)
-                eta = ((total_size - current_size) / (current_size / elapsed)) if current_size > 0 else 0
-                
-                text = (
-                    f"<code>[{bar}] {percent:.1f}%</code>\n"
-                    f"<b>┠ Processed:</b> <code>{get_readable_file_size(current_size)}</code> of <code>{get_readable_file_size(total_size)}</code>\n"
-                    f"<b>┠ Status:</b> <code>Extracting</code> | ETA: <code>{int(eta)}s</code>\n"
-                    f"<b>┠ Speed:</b> <code>{get_readable_file_size(int(current_size / elapsed))}/s</code> | Elapsed: <code>{int(elapsed)}s</code>\n"
-                    f"<b>┠ Engine:</b> <code>Archive Extractor</code>\n"
-                    f"<b>┠ User:</b> <code>{user_name}</code> | ID: <code>{uid}</code>\n"
-                    f"<b>┖</b>"
-                )
+        # The engines count bytes and members as they write them.
+        current_size = job.bytes_done
+        files_done   = job.members_done
+
+        if total_size and total_size > 0:
+            if job.percent is not None:
+                percent = float(job.percent)
             else:
-                # No total size available, show indeterminate progress
-                bar = "■" * (int(elapsed) % 12) + "□" * (12 - (int(elapsed) % 12))
-                text = (
-                    f"<code>[{bar}] Processing...</code>\n"
-                    f"<b>┠ Extracted:</b> <code>{get_readable_file_size(current_size)}</code>\n"
-                    f"<b>┠ Status:</b> <code>Extracting</code>\n"
-                    f"<b>┠ Speed:</b> <code>{get_readable_file_size(int(current_size / elapsed))}/s</code> | Elapsed: <code>{int(elapsed)}s</code>\n"
-                    f"<b>┠ Engine:</b> <code>Archive Extractor</code>\n"
-                    f"<b>┠ User:</b> <code>{user_name}</code> | ID: <code>{uid}</code>\n"
-                    f"<b>┖</b>"
-                )
+                percent = min((current_size * 100) / total_size, 99.9)
+            bar = create_progress_bar(current_size, total_size, length=12)
+            eta = ((total_size - current_size) / (current_size / elapsed)) if current_size > 0 else 0
+
+            text = (
+                f"<code>[{bar}] {percent:.1f}%</code>\n"
+                f"<b>┠ Processed:</b> <code>{get_readable_file_size(current_size)}</code> of <code>{get_readable_file_size(total_size)}</code>\n"
+                f"<b>┠ Files:</b> <code>{files_done}</code>\n"
+                f"<b>┠ Status:</b> <code>Extracting</code> | ETA: <code>{int(eta)}s</code>\n"
+                f"<b>┠ Speed:</b> <code>{get_readable_file_size(int(current_size / elapsed))}/s</code> | Elapsed: <code>{int(elapsed)}s</code>\n"
+                f"<b>┠ Engine:</b> <code>Archive Extractor</code>\n"
+                f"<b>┠ User:</b> <code>{user_name}</code> | ID: <code>{uid}</code>\n"
+                f"<b>┖</b>"
+            )
+        else:
+            # No total size available, show indeterminate progress
+            bar = "■" * (int(elapsed) % 12) + "□" * (12 - (int(elapsed) % 12))
+            done = f" {job.percent}%" if job.percent is not None else ""
+            text = (
+                f"<code>[{bar}] Processing...{done}</code>\n"
+                f"<b>┠ Extracted:</b> <code>{get_readable_file_size(current_size)}</code> | Files: <code>{files_done}</code>\n"
+                f"<b>┠ Status:</b> <code>Extracting</code>\n"
+                f"<b>┠ Speed:</b> <code>{get_readable_file_size(int(current_size / elapsed))}/s</code> | Elapsed: <code>{int(elapsed)}s</code>\n"
+                f"<b>┠ Engine:</b> <code>Archive Extractor</code>\n"
+                f"<b>┠ User:</b> <code>{user_name}</code> | ID: <code>{uid}</code>\n"
+                f"<b>┖</b>"
+            )
 
-            try:
-                await status.edit(text, disable_web_page_preview=True)
-            except Exception:
-                pass
+        try:
+            await status.edit(
+                text,
+                disable_web_page_preview=True,
+                reply_markup=_cancel_keyboard(uid),
+            )
+        except Exception:
+            pass
 
-    # Start progress updater task
-    progress_task = asyncio.create_task(update_progress())
 
+async def _run_extraction(status, archive_path: str, dest_dir: str, members,
+                          total_size, user_name: str, uid: int,
+                          fmt: str = None, manifest: ArchiveManifest = None,
+                          nested_depth: int = 0, chunks=None, input_size: int = None) -> list:
+    """
+    Extract (all or only `members`) with a live progress bar and a Cancel
+    button, under the configured time limit and the user's output budget.
+    With `chunks`, an async iterator over a tarball still downloading
+    (`input_size` bytes, if known), it is extracted from the download
+    instead of archive_path.
+    Returns the (path, size) pairs the engine recorded as it wrote them.
+    """
+    premium = await _size_limit(uid) == Config.PREMIUM_LIMIT
+    job = ExtractJob(
+        timeout=Config.EXTRACT_TIMEOUT,
+        max_output=Config.PREMIUM_EXTRACT_LIMIT if premium else Config.FREE_EXTRACT_LIMIT,
+        max_ratio=Config.MAX_COMPRESSION_RATIO,
+    )
+    # A user can have several extractions going (one per archive); each is
+    # cancelled from the progress message it reports on.
+    key = (uid, status.id)
+    _jobs[key] = job
+    progress_task = asyncio.create_task(
+        _extraction_progress(status, total_size, user_name, uid, job)
+    )
     try:
-        # Run extraction in thread pool to not block event loop
-        loop = asyncio.get_event_loop()
-        files = await loop.run_in_executor(None, _extract_sync, archive_path, dest_dir)
-    except Exception as e:
-        progress_task.cancel()
-        await status.edit(f"❌ Extraction failed!\n`{e}`")
-        shutil.rmtree(dest_dir, ignore_errors=True)
-        os.remove(archive_path)
-        return
+        if chunks is not None:
+            job.input_size = input_size or None
+            await extract_download(chunks, dest_dir, fmt, job, input_size)
+        else:
+            await extract_archive_async(
+                archive_path, dest_dir, members, fmt, manifest, job, nested_depth
+            )
+        return job.files
     finally:
+        _jobs.pop(key, None)
         progress_task.cancel()
         try:
             await progress_task
         except asyncio.CancelledError:
             pass
 
-    # Cleanup archive
-    try:
-        os.remove(archive_path)
-    except Exception:
-        pass
 
-    if not files:
-        await status.edit("❌ Archive is empty or extraction failed.")
-        shutil.rmtree(dest_dir, ignore_errors=True)
+def _extraction_error(e: Exception) -> str:
+    if isinstance(e, JobCancelled):
+        return "❌ Extraction cancelled."
+    if isinstance(e, OutputLimitExceeded):
+        return f"❌ Extraction stopped!\n`{e}`"
+    return f"❌ Extraction failed!\n`{e}`"
+
+
+@Client.on_callback_query(filters.regex(r"^cancel_job#"))
+async def cancel_job_cb(client: Client, query: CallbackQuery):
+    uid = int(query.data.split("#")[1])
+    if query.from_user.id != uid:
         return
+    job = _jobs.get((uid, query.message.id))
+    if not job:
+        return await query.answer("Nothing to cancel.", show_alert=True)
+    job.cancel()
+    await query.answer("Cancelling...")
+
+
+def _job_dirs(uid: int) -> tuple:
+    """The user's download dir and a fresh output dir for one extraction job."""
+    user_dir = os.path.join(Config.DOWNLOAD_DIR, str(uid))
+    os.makedirs(user_dir, exist_ok=True)
+    return user_dir, tempfile.mkdtemp(prefix="extracted-", dir=user_dir)
+
+
+def _cleanup_session(sess: dict):
+    """Remove everything a session keeps on disk or in memory."""
+    if sess.get("manifest"):
+        sess["manifest"].close()
+    if sess.get("memory"):
+        sess["memory"].close()
+    shutil.rmtree(sess["dest"], ignore_errors=True)
+    archive = sess.get("archive")
+    if archive and os.path.exists(archive):
+        remove_archive(archive)
+
+
+async def _process_archive(client: Client, message: Message, archive_path):
+    """`archive_path` is a local path or a MemoryArchive from _download()."""
+    status   = await message.reply_text("🔎 Reading archive...")
+    prepared = await _read_archive(message, status, archive_path)
+    if prepared:
+        await _open_session(message, status, prepared)
+
+
+async def _read_archive(message: Message, status, archive_path) -> dict | None:
+    """
+    First half of _process_archive: sniff and list the archive, extracting
+    it up front when there is no index (or nested archives to flatten).
+    The archive's name plays no part here, so this also runs in the
+    background while the rename prompt is open. Returns the session fields,
+    or None once an error has been shown on `status`.
+    """
+    uid = message.from_user.id
+    user_name = message.from_user.first_name or "User"
+
+    user_dir, dest_dir = _job_dirs(uid)
+    loop = asyncio.get_event_loop()
+
+    # Archives held in memory are listed from RAM; anything Python can't
+    # read there is written out and takes the disk path below.
+    memory = None
+    if isinstance(archive_path, MemoryArchive):
+        memory, archive_path = archive_path, None
+        try:
+            manifest = await loop.run_in_executor(None, memory.list)
+        except Exception as e:
+            log.info("In-memory listing of '%s' failed, using disk: %s", memory.name, e)
+            manifest = None
+        if manifest is None:
+            archive_path = await loop.run_in_executor(None, memory.spill, user_dir)
+            memory = None
+
+    # Sniff the format and read the index once into a manifest that sizing,
+    # progress, the keyboard and extraction all reuse. Nothing is written to
+    # disk until the user picks what they want.
+    if memory:
+        fmt = manifest.fmt
+    else:
+        try:
+            fmt  = await loop.run_in_executor(None, archive_format, archive_path)
+            if fmt is None:
+                raise RuntimeError("Not a supported archive format.")
+            manifest = await loop.run_in_executor(None, list_archive, archive_path, fmt)
+        except Exception as e:
+            await status.edit(f"❌ Extraction failed!\n`{e}`")
+            _cleanup_session({"dest": dest_dir, "archive": archive_path})
+            return None
+
+    # With "Extract Nested Archives" on, archives inside the archive are
+    # unpacked up front so the selection shows their contents directly.
+    u_data = await db.get_user(uid)
+    nested = bool(
+        u_data and u_data.get("nested", False) and manifest is not None
+        and any(format_from_name(e.name) for e in manifest.entries)
+    )
+    if nested:
+        manifest.close()
+        manifest = None
+        if memory:
+            archive_path = await loop.run_in_executor(None, memory.spill, user_dir)
+            memory = None
+
+    if manifest is None:
+        # No readable index with the tools installed (or nested archives to
+        # flatten) — extract everything up front and build the manifest
+        # from what was written.
+        await status.edit(
+            "📦 Extracting nested archives..." if nested else "📦 Extracting archive..."
+        )
+        try:
+            files = await _run_extraction(
+                status, archive_path, dest_dir, None, None, user_name, uid, fmt=fmt,
+                nested_depth=Config.NESTED_MAX_DEPTH if nested else 0,
+            )
+        except Exception as e:
+            await status.edit(_extraction_error(e))
+            _cleanup_session({"dest": dest_dir, "archive": archive_path})
+            return None
+
+        # Cleanup archive
+        remove_archive(archive_path)
+        archive_path = None
+        manifest = ArchiveManifest.from_files(dest_dir, fmt, files)
+
+    if not manifest.entries:
+        await status.edit("❌ Archive is empty or extraction failed.")
+        _cleanup_session({
+            "dest": dest_dir, "archive": archive_path, "manifest": manifest, "memory": memory,
+        })
+        return None
+
+    return {"archive": archive_path, "memory": memory, "manifest": manifest, "dest": dest_dir}
+
+
+async def _open_session(message: Message, status, prepared: dict):
+    """Second half of _process_archive: store the session, show the keyboard."""
+    uid          = message.from_user.id
+    archive_path = prepared["archive"]
+    manifest     = prepared["manifest"]
+
+    # A new archive replaces any session the user left open.
+    old = _sessions.pop(uid, None)
+    if old:
+        if old.get("archive") == archive_path:
+            old["archive"] = None   # the same file, now this session's
+        _cleanup_session(old)
 
     # Store session
     _sessions[uid] = {
-        "files":    files,
-        "dest":     dest_dir,
-        "selected": set(range(len(files))),  # all selected by default
+        "archive":  archive_path,            # None once everything is extracted (or in memory)
+        "memory":   prepared["memory"],      # MemoryArchive on the in-memory path
+        "remote":   prepared.get("remote"),  # RemoteZip whose members are fetched on upload
+        "manifest": manifest,
+        "dest":     prepared["dest"],
+        "selected": set(range(len(manifest))),  # all selected by default
         "msg":      message,
         "status":   status,
     }
 
     await status.edit(
-        script.EXTRACT_CHOICE_TXT.format(count=len(files)),
+        script.EXTRACT_CHOICE_TXT.format(count=len(manifest)),
         reply_markup=_build_filter_keyboard(uid),
     )
 
 
 def _build_filter_keyboard(uid: int) -> InlineKeyboardMarkup:
-    sess  = _sessions.get(uid, {})
-    files = sess.get("files", [])
-    sel   = sess.get("selected", set())
-    rows  = []
-
-    for i, path in enumerate(files):
-        name  = os.path.basename(path)
-        size  = get_readable_file_size(os.path.getsize(path))
+    sess    = _sessions.get(uid, {})
+    entries = sess["manifest"].entries if sess else []
+    sel     = sess.get("selected", set())
+    rows    = []
+
+    for i, entry in enumerate(entries):
+        name  = os.path.basename(entry.name)
+        size  = get_readable_file_size(entry.size)
         tick  = "✅" if i in sel else "☐"
         rows.append([InlineKeyboardButton(
             f"{tick} {name} ({size})",
@@ -397,7 +900,7 @@ async def sel_all_cb(client: Client, query: CallbackQuery):
         return
     sess = _sessions.get(uid)
     if sess:
-        sess["selected"] = set(range(len(sess["files"])))
+        sess["selected"] = set(range(len(sess["manifest"])))
         await query.message.edit_reply_markup(_build_filter_keyboard(uid))
     await query.answer("All selected")
 
@@ -421,11 +924,62 @@ async def cancel_ext_cb(client: Client, query: CallbackQuery):
         return
     sess = _sessions.pop(uid, None)
     if sess:
-        shutil.rmtree(sess["dest"], ignore_errors=True)
+        _cleanup_session(sess)
     await query.message.edit("❌ Cancelled.")
     await query.answer()
 
 
+async def _upload_member(client: Client, sess: dict, member: str, stream: bool, **kwargs):
+    """
+    Upload one archive member. Members unpacked into memory are uploaded
+    from their buffer, which is freed straight after. When `stream` is set
+    the member is piped from the archive into the upload; if Pyrogram needs
+    to seek (e.g. to resend a missing part) it is extracted to disk and
+    uploaded from there instead.
+    """
+    memory = sess.get("memory")
+    buf    = memory.member(member) if memory else None
+    if buf is not None:
+        try:
+            await upload_file(bot=client, file_path=buf, **kwargs)
+        finally:
+            memory.drop(member)
+        return
+
+    fpath = _member_path(sess["dest"], member)
+    if stream:
+        loop = asyncio.get_event_loop()
+        src  = await loop.run_in_executor(
+            None, ZipMemberStream, sess["manifest"].zip_file(), member
+        )
+        try:
+            await upload_file(bot=client, file_path=src, **kwargs)
+            return
+        except io.UnsupportedOperation:
+            log.info("Upload of '%s' needs to seek, falling back to disk.", member)
+        finally:
+            src.close()
+        await loop.run_in_executor(
+            None, extract_archive, sess["archive"], sess["dest"], [member],
+            None, sess["manifest"],
+        )
+    await upload_file(bot=client, file_path=fpath, **kwargs)
+
+
+def _member_path(dest_dir: str, member: str) -> str:
+    """
+    Where the engines write `member` under dest_dir. Names come straight
+    from the archive listing: an absolute name is written under dest_dir
+    (tar's data filter strips the slash), and anything that would resolve
+    outside it, through '..' or a symlink, is refused rather than uploaded.
+    """
+    path = safe_join(dest_dir, member.lstrip("/"))
+    real = os.path.realpath(dest_dir)
+    if not os.path.realpath(path).startswith(real + os.sep):
+        raise RuntimeError(f"Path traversal attempt blocked: {member}")
+    return path
+
+
 @Client.on_callback_query(filters.regex(r"^upload_sel#"))
 async def upload_selected_cb(client: Client, query: CallbackQuery):
     uid = int(query.data.split("#")[1])
@@ -437,26 +991,74 @@ async def upload_selected_cb(client: Client, query: CallbackQuery):
 
     selected = sorted(sess["selected"])
     if not selected:
+        _sessions[uid] = sess
         return await query.answer("No files selected!", show_alert=True)
 
+    # Get user info for progress
+    user_name = query.from_user.first_name or "User"
+    manifest  = sess["manifest"]
+    members   = manifest.names(selected)
+
+    # In-memory archives unpack the selection into RAM; if the memory budget
+    # can't take it right now, the archive goes to disk for this job.
+    memory = sess.get("memory")
+    if memory:
+        loop = asyncio.get_event_loop()
+        try:
+            if not await loop.run_in_executor(None, memory.extract, members):
+                sess["archive"] = await loop.run_in_executor(
+                    None, memory.spill, os.path.dirname(sess["dest"])
+                )
+                sess["memory"] = None
+        except Exception as e:
+            await query.message.edit(_extraction_error(e))
+            _cleanup_session(sess)
+            return
+
+    # Remote ZIPs: download just the selected members into the local copy.
+    remote = sess.get("remote")
+    if remote:
+        if not await _check_limit(client, sess["msg"], remote.span_size(members)):
+            _sessions[uid] = sess
+            return await query.answer()
+        await query.message.edit("⬇️ Fetching selected files...")
+        try:
+            await remote.fetch(members, make_progress(query.message, "Download", user_name, uid))
+        except Exception as e:
+            await query.message.edit(f"❌ Download failed!\n`{e}`")
+            _cleanup_session(sess)
+            return
+
+    # ZIP members can be decompressed straight into the upload; everything
+    # else is extracted first, and only the chosen members at that.
+    stream = bool(
+        Config.STREAM_UPLOADS and sess.get("archive") and can_stream(manifest.fmt)
+    )
+    if sess.get("archive") and not stream:
+        await query.message.edit("📦 Extracting selected files...")
+        try:
+            await _run_extraction(
+                query.message, sess["archive"], sess["dest"], members,
+                manifest.size_of(selected), user_name, uid, manifest=manifest,
+            )
+        except Exception as e:
+            await query.message.edit(_extraction_error(e))
+            _cleanup_session(sess)
+            return
+
     await query.message.edit("⬆️ Uploading selected files...")
     u_data   = await db.get_user(uid)
     thumb    = u_data.get("thumbnail") if u_data else None
     spoiler  = u_data.get("spoiler", False) if u_data else False
     as_doc   = u_data.get("as_document", False) if u_data else False
 
-    # Get user info for progress
-    user_name = query.from_user.first_name or "User"
-
-    for i in selected:
-        fpath = sess["files"][i]
-        fname = os.path.basename(fpath)
+    for member in members:
+        fname = os.path.basename(member)
         status = await query.message.reply_text(f"⬆️ Uploading `{fname}`...")
         try:
-            await upload_file(
-                bot=client,
+            await _upload_member(
+                client, sess, member, stream,
                 chat_id=query.message.chat.id,
-                file_path=fpath,
                 caption=f"📄 `{fname}`",
                 thumb=thumb,
                 as_document=as_doc,
@@ -469,10 +1071,11 @@ async def upload_selected_cb(client: Client, query: CallbackQuery):
         except Exception as e:
             await status.edit(f"❌ Failed to upload `{fname}`\n`{e}`")
 
-    shutil.rmtree(sess["dest"], ignore_errors=True)
+    _cleanup_session(sess)
     await query.message.edit("✅ All selected files uploaded!")
 
 
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Direct link download
 # ──────────────────────────────────────────────────────────────────────────────
@@ -490,7 +1093,53 @@ async def url_download(client: Client, message: Message):
     dest   = os.path.join(Config.DOWNLOAD_DIR, str(uid))
     os.makedirs(dest, exist_ok=True)
 
-    from utils import download_url
+    from utils import download_url, open_url, probe_url
+
+    # Size, name and first bytes before any of the body is transferred, so
+    # oversize files and web pages are turned away up front.
+    try:
+        probe = await probe_url(url)
+    except Exception as e:
+        return await status.edit(f"❌ Download failed!\n`{e}`")
+    head = probe.head.lstrip()[:15].lower()
+    if probe.content_type == "text/html" or head.startswith((b"<!doctype html", b"<html")):
+        return await status.edit(
+            "❌ This link opens a web page, not a file.\nSend a direct download link."
+        )
+    if probe.size and not await _check_limit(client, message, probe.size):
+        await status.delete()
+        return
+    # The name decides whether this is an archive at all (a .docx or .apk
+    # is a ZIP too, but is uploaded as is); the first bytes then tell which.
+    fname    = probe.filename
+    fmt      = None
+    if is_archive(fname):
+        fmt = sniff_format(probe.head, fname) if probe.head else format_from_name(fname)
+    max_size = await _size_limit(uid)
+
+    # ZIPs on servers that serve byte ranges are listed from their central
+    # directory; only the members picked are fetched, on upload.
+    if probe.ranges and _can_remote_zip(fmt, u_data):
+        prepared = await _remote_archive(message, status, url, fname)
+        if prepared:
+            await _open_session(message, status, prepared)
+        if prepared is not False:
+            return
+
+    # Tarballs are extracted while they download.
+    if _can_pipeline(fmt, u_data):
+        try:
+            async with open_url(url, fname, max_size) as (fname, total, chunks):
+                prepared = await _pipeline_archive(message, status, fname, total, chunks)
+        except DownloadTooLarge as e:
+            await status.delete()
+            await _reply_too_large(message, e.limit)
+            return
+        except Exception as e:
+            return await status.edit(f"❌ Download failed!\n`{e}`")
+        if prepared:
+            await _open_session(message, status, prepared)
+        return
 
     async def _prog(done, total, speed, eta):
         bar = create_progress_bar(done, total, length=12)
@@ -515,7 +1164,11 @@ async def url_download(client: Client, message: Message):
     _prog.start_time = time.time()
 
     try:
-        local = await download_url(url, dest, _prog)
+        local = await download_url(url, dest, _prog, fname, max_size)
+    except DownloadTooLarge as e:
+        await status.delete()
+        await _reply_too_large(message, e.limit)
+        return
     except Exception as e:
         return await status.edit(f"❌ Download failed!\n`{e}`")
 
@@ -0,0 +1,91 @@
+"""
+Shared fixtures: a local HTTP server with byte-range support, and the
+bot's shared HTTP client bound to the test's event loop. Tests run their
+coroutines with asyncio.run(), so both fixtures hand out async context
+managers to enter inside it.
+"""
+import os
+import sys
+import contextlib
+
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import new_http_session, temp  # noqa: E402
+
+ETAG = '"v1"'
+
+
+@contextlib.asynccontextmanager
+async def _serve(data: bytes, drop_after: int | None = None):
+    """
+    Serve `data` at /file with Range / If-Range support and yield
+    (url, log), where log gets (Range header, bytes sent) per request.
+    With `drop_after`, the first request's connection is cut after that
+    many bytes of the body.
+    """
+    log = []
+
+    async def _file(request):
+        start, end, status = 0, len(data), 200
+        rng = request.headers.get("Range")
+        if rng and request.headers.get("If-Range", ETAG) == ETAG:
+            first, _, last = rng.removeprefix("bytes=").partition("-")
+            if not first:   # suffix range: the last N bytes
+                start = max(len(data) - int(last), 0)
+            else:
+                start = int(first)
+                end   = min(int(last) + 1, len(data)) if last else len(data)
+            status = 206
+        headers = {"Accept-Ranges": "bytes", "ETag": ETAG,
+                   "Content-Length": str(end - start)}
+        if status == 206:
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{len(data)}"
+        resp = web.StreamResponse(status=status, headers=headers)
+        await resp.prepare(request)
+        body = data[start:end]
+        if drop_after is not None and not log:
+            log.append((rng, drop_after))
+            await resp.write(body[:drop_after])
+            request.transport.close()
+            return resp
+        log.append((rng, len(body)))
+        await resp.write(body)
+        return resp
+
+    app = web.Application()
+    app.router.add_get("/file", _file)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/file", log
+    finally:
+        await runner.cleanup()
+
+
+@contextlib.asynccontextmanager
+async def _http_client():
+    """The bot's shared HTTP client (utils.temp.HTTP) for one test."""
+    temp.HTTP = new_http_session()
+    try:
+        yield temp.HTTP
+    finally:
+        await temp.HTTP.close()
+        temp.HTTP = None
+
+
+@pytest.fixture
+def serve():
+    """`async with serve(data, drop_after=None) as (url, log)`: see _serve."""
+    return _serve
+
+
+@pytest.fixture
+def http_client():
+    """`async with http_client()`: the shared client for one test."""
+    return _http_client
@@ -0,0 +1,35 @@
+import os
+import asyncio
+
+import aiohttp
+import pytest
+
+from config import Config
+from utils import download_url
+
+
+def test_resumes_part_file_after_dropped_connection(tmp_path, monkeypatch, serve, http_client):
+    # No retries inside download_url: the second call picks up the .part
+    # file the first one left, as sending the URL again after a restart does.
+    monkeypatch.setattr(Config, "DOWNLOAD_RETRIES", 0)
+    data = os.urandom(3 * 1024 * 1024 + 123)
+    cut  = 1024 * 1024
+    dest = str(tmp_path)
+
+    async def _run():
+        async with serve(data, drop_after=cut) as (url, log), http_client():
+            with pytest.raises(aiohttp.ClientError):
+                await download_url(url, dest, filename="file.bin")
+            assert sorted(os.listdir(dest)) == ["file.bin.part", "file.bin.part.json"]
+            path = await download_url(url, dest, filename="file.bin")
+            return path, log
+
+    path, log = asyncio.run(_run())
+    with open(path, "rb") as f:
+        assert f.read() == data
+    assert os.listdir(dest) == ["file.bin"]
+    # The second attempt only asked for what the first one didn't write.
+    (first_range, _), (resume_range, sent) = log
+    assert first_range is None
+    assert resume_range.startswith("bytes=") and resume_range != "bytes=0-"
+    assert sent <= len(data) - cut
@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+from plugins.unzip import _member_path
+
+
+def test_absolute_member_stays_under_dest(tmp_path):
+    dest = str(tmp_path)
+    assert _member_path(dest, "/etc/hostname") == os.path.join(dest, "etc", "hostname")
+
+
+@pytest.mark.parametrize("member", ["../outside", "a/../../outside", "C:/x", "link/hostname"])
+def test_member_outside_dest_is_refused(tmp_path, member):
+    os.symlink("/etc", tmp_path / "link")
+    with pytest.raises(RuntimeError):
+        _member_path(str(tmp_path), member)
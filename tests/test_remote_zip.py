@@ -0,0 +1,36 @@
+import io
+import os
+import asyncio
+import zipfile
+
+from helper.remote_zip import RemoteZip
+
+
+def _archive(members: int = 40, size: int = 200 * 1024) -> tuple:
+    """A ZIP of incompressible members, and their contents by name."""
+    contents = {f"dir/m{i:02d}.bin": os.urandom(size) for i in range(members)}
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in contents.items():
+            zf.writestr(name, data)
+    return buf.getvalue(), contents
+
+
+def test_fetches_selected_members_only(tmp_path, serve, http_client):
+    data, contents = _archive()
+    wanted = ["dir/m03.bin", "dir/m30.bin"]
+    path = str(tmp_path / "remote.zip")
+
+    async def _run():
+        async with serve(data) as (url, log), http_client():
+            remote = await RemoteZip.open(url, path)
+            assert remote is not None and remote.size == len(data)
+            fetched = await remote.fetch(wanted)
+            return fetched, sum(sent for _, sent in log)
+
+    fetched, served = asyncio.run(_run())
+    with zipfile.ZipFile(path) as zf:
+        for name in wanted:
+            assert zf.read(name) == contents[name]
+    assert fetched < 3 * 200 * 1024
+    assert served < len(data) // 4
@@ -0,0 +1,30 @@
+import os
+import asyncio
+import hashlib
+
+from config import Config
+from utils import download_url
+
+
+def test_many_connections_reassemble_exact_file(tmp_path, monkeypatch, serve, http_client):
+    # Connections that finish early keep splitting the others' segments
+    # while their chunks are being written; every byte must still land once.
+    monkeypatch.setattr(Config, "DOWNLOAD_CONNECTIONS", 16)
+    monkeypatch.setattr(Config, "SEGMENTED_MIN_SIZE", 1024 * 1024)
+    data = os.urandom(40 * 1024 * 1024 + 321)
+
+    async def _run():
+        async with serve(data) as (url, log), http_client():
+            paths = []
+            for i in range(3):
+                paths.append(await download_url(url, str(tmp_path / str(i)), filename="f.bin"))
+            return paths, log
+
+    paths, log = asyncio.run(_run())
+    for path in paths:
+        with open(path, "rb") as f:
+            assert hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest()
+    for rng, _ in log:
+        if rng:
+            first, _, last = rng.removeprefix("bytes=").partition("-")
+            assert not last or int(first) <= int(last), rng
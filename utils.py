@@ -3,7 +3,8 @@ import time
 import asyncio
 import aiohttp
 import logging
-from typing import Tuple, Optional
+from contextlib import asynccontextmanager
+from typing import NamedTuple, Tuple, Optional
 
 from pyrogram import Client
 from pyrogram.errors import UserIsBlocked, InputUserDeactivated, PeerIdInvalid, FloodWait
@@ -20,6 +21,7 @@ class temp:
     B_LINK          = ""
     ME              = None           # bot info
     U_CLIENT        = None           # user Pyrogram client (session string)
+    HTTP            = None           # shared aiohttp session (see http_session)
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -218,56 +220,265 @@ async def junk_group(chat_id: int, message) -> Tuple[bool, str, str]:
         return False, "deleted", str(e) + "\n"
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Shared HTTP client
+# ──────────────────────────────────────────────────────────────────────────────
+def new_http_session() -> aiohttp.ClientSession:
+    """
+    The bot-wide HTTP client: one connection pool with per-host limits,
+    keep-alive and cached DNS, so jobs on the same host skip the DNS
+    lookup and the TCP / TLS handshakes. Created in bot.main().
+    """
+    from config import Config
+
+    connector = aiohttp.TCPConnector(
+        limit=Config.HTTP_CONNECTIONS,
+        limit_per_host=Config.HTTP_CONNECTIONS_PER_HOST,
+        ttl_dns_cache=Config.HTTP_DNS_CACHE,
+        keepalive_timeout=Config.HTTP_KEEPALIVE,
+        enable_cleanup_closed=True,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+def http_session() -> aiohttp.ClientSession:
+    """The shared HTTP client; made on first use when bot.main() didn't (scripts)."""
+    if temp.HTTP is None or temp.HTTP.closed:
+        temp.HTTP = new_http_session()
+    return temp.HTTP
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Download helpers (optimized chunk size and error handling)
 # ──────────────────────────────────────────────────────────────────────────────
-async def download_url(url: str, dest: str, progress_callback=None) -> str:
+class DownloadTooLarge(Exception):
+    """A download without a known length went past the size allowed."""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"Download passed the {get_readable_file_size(limit)} limit.")
+        self.size  = size
+        self.limit = limit
+
+
+class UrlProbe(NamedTuple):
+    filename: str        # Content-Disposition name, else the last URL path segment
+    size: int            # 0 if the server doesn't say
+    content_type: str
+    head: bytes          # first bytes of the body, b"" if they couldn't be had cheaply
+    ranges: bool         # byte ranges can be requested
+
+
+def url_filename(url: str) -> str:
+    """Filename from the URL path, without query params."""
+    return url.split("?")[0].split("/")[-1] or "downloaded_file"
+
+
+async def probe_url(url: str) -> UrlProbe:
+    """
+    Look at a URL before downloading it: a HEAD request for the size, type
+    and Content-Disposition filename, then a ranged GET for the first
+    SNIFF_SIZE bytes (also the fallback when HEAD isn't supported). A
+    server that ignores the range has its response closed after those
+    bytes, so the body is never transferred.
+    """
+    from helper.formats import SNIFF_SIZE
+    from helper.segmented import accepts_ranges, content_range
+
+    filename = url_filename(url)
+    size, ctype, ranges, head = 0, "", False, b""
+
+    def _named(resp) -> str:
+        cd = resp.content_disposition
+        name = os.path.basename((cd.filename or "") if cd else "").strip()
+        return name if name not in ("", ".", "..") else filename
+
+    timeout = aiohttp.ClientTimeout(total=60, connect=30)
+
+    session = http_session()
+    try:
+        async with session.head(url, allow_redirects=True, timeout=timeout) as resp:
+            resp.raise_for_status()
+            size     = int(resp.headers.get("Content-Length", 0))
+            ctype    = resp.content_type
+            ranges   = accepts_ranges(resp)
+            filename = _named(resp)
+            head_ok  = True
+    except aiohttp.ClientResponseError:
+        head_ok = False   # e.g. 405; the GET below answers instead
+
+    if ranges or not head_ok:
+        headers = {"Range": f"bytes=0-{SNIFF_SIZE - 1}"}
+        async with session.get(url, headers=headers, timeout=timeout) as resp:
+            resp.raise_for_status()
+            rng = content_range(resp)
+            if rng:
+                size, ranges = rng[2], True
+            elif not head_ok:
+                size = int(resp.headers.get("Content-Length", 0))
+            if not head_ok:
+                ctype    = resp.content_type
+                filename = _named(resp)
+            while len(head) < SNIFF_SIZE:
+                chunk = await resp.content.read(SNIFF_SIZE - len(head))
+                if not chunk:
+                    break
+                head += chunk
+
+    return UrlProbe(filename, size, ctype, head, ranges)
+
+
+async def download_url(url: str, dest: str, progress_callback=None,
+                       filename: str | None = None, max_size: int | None = None) -> str:
     """
     Download a direct URL file to dest directory. Returns local path.
     Optimized with larger chunk size and better error handling.
+    Large files on servers that accept byte ranges are fetched over
+    several connections (Config.DOWNLOAD_CONNECTIONS).
+
+    The file is written as <name>.part. When the server supports ranges,
+    a network error is retried (Config.DOWNLOAD_RETRIES times) from where
+    it stopped, and the .part file is kept so sending the URL again, even
+    after a restart, resumes it.
+
+    `filename` overrides the name taken from the URL. The download stops
+    with DownloadTooLarge as soon as it passes `max_size`, for servers that
+    don't send a length up front.
     """
+    from config import Config
+    from helper.partfile import PartFile
+
     os.makedirs(dest, exist_ok=True)
     
     # Extract filename from URL, remove query params
-    filename = url.split("?")[0].split("/")[-1] or "downloaded_file"
+    filename = filename or url_filename(url)
     local_path = os.path.join(dest, filename)
+    part = PartFile(local_path, url)
 
-    connector = aiohttp.TCPConnector(limit=10)
-    timeout = aiohttp.ClientTimeout(total=None, connect=30)
-    
-    async with aiohttp.ClientSession(connector=connector) as session:
+    session = http_session()
+    for attempt in range(Config.DOWNLOAD_RETRIES + 1):
         try:
-            async with session.get(url, timeout=timeout) as resp:
-                resp.raise_for_status()
-                total = int(resp.headers.get("Content-Length", 0))
-                done = 0
-                start = time.time()
-
-                # Use larger chunk size for faster downloads (256KB)
-                with open(local_path, "wb") as f:
-                    async for chunk in resp.content.iter_chunked(262144):
-                        f.write(chunk)
-                        done += len(chunk)
-                        
-                        if progress_callback:
-                            elapsed = time.time() - start
-                            speed = done / elapsed if elapsed > 0 else 0
-                            eta = (total - done) / speed if speed > 0 else 0
-                            await progress_callback(done, total, speed, eta)
-        
-        except aiohttp.ClientError as e:
-            log.error(f"Download failed for {url}: {e}")
-            # Clean up partial file
-            if os.path.exists(local_path):
-                os.remove(local_path)
+            await _download_part(session, part, progress_callback, max_size)
+            break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # A 4xx won't go away on retry (and may mean the .part is stale)
+            fatal = isinstance(e, aiohttp.ClientResponseError) and e.status < 500
+            if fatal or not part.resumable or attempt == Config.DOWNLOAD_RETRIES:
+                log.error(f"Download failed for {url}: {e}")
+                # Keep what can be resumed, clean up the rest
+                if fatal or not part.resumable:
+                    part.discard()
+                raise
+            log.warning(f"Download of {url} interrupted, resuming: {e}")
+            await asyncio.sleep(2 ** attempt)
+        except DownloadTooLarge:
+            part.discard()
             raise
         except Exception as e:
             log.exception(f"Unexpected error downloading {url}: {e}")
-            if os.path.exists(local_path):
-                os.remove(local_path)
+            part.discard()
             raise
 
-    return local_path
+    return part.finish()
+
+
+async def _download_part(session: aiohttp.ClientSession, part, progress_callback=None,
+                         max_size: int | None = None):
+    """
+    One attempt of download_url: resume `part` if it holds a previous
+    attempt, otherwise start it over, and fill in what is missing.
+    """
+    from config import Config
+    from helper.segmented import accepts_ranges, content_range, download_segmented, validator
+    from helper.writer import FileWriter
+
+    timeout  = aiohttp.ClientTimeout(total=None, connect=30, sock_read=60)
+    headers  = {}
+    resuming = part.load()
+    if resuming:
+        headers = {"Range": f"bytes={part.missing[0].pos}-", "If-Range": part.validator}
+
+    async with session.get(part.url, headers=headers, timeout=timeout) as resp:
+        resp.raise_for_status()
+        if resuming and resp.status == 206:
+            if content_range(resp) != (part.missing[0].pos, part.size - 1, part.size):
+                raise RuntimeError("The server answered with an unexpected range.")
+        else:
+            # Fresh download, or the file changed since the .part was written
+            total = int(resp.headers.get("Content-Length", 0))
+            part.start(total, validator(resp) if accepts_ranges(resp) else None)
+
+        total = part.size or int(resp.headers.get("Content-Length", 0))
+        base  = part.done
+        start = time.time()
+
+        # Disk writes go through a writer thread so a slow disk can't stall
+        # the event loop; the sidecar is only saved once the bytes it
+        # counts have been flushed.
+        writer = FileWriter(part.part, os.O_WRONLY | os.O_CREAT)
+
+        async def _report(done: int):
+            if max_size and base + done > max_size:
+                raise DownloadTooLarge(base + done, max_size)
+            if part.due():
+                meta = part.state()
+                await writer.flush()
+                part.save(meta)
+            if progress_callback:
+                elapsed = time.time() - start
+                speed = done / elapsed if elapsed > 0 else 0
+                eta = (total - base - done) / speed if speed > 0 else 0
+                await progress_callback(base + done, total, speed, eta)
+
+        if part.resumable:
+            connections = (
+                Config.DOWNLOAD_CONNECTIONS if total >= Config.SEGMENTED_MIN_SIZE else 1
+            )
+            try:
+                await download_segmented(
+                    session, part.url, writer, part.missing, connections,
+                    _report, first=resp, if_range=part.validator,
+                )
+            finally:
+                await writer.close()
+                part.save()
+        else:
+            # Use larger chunk size for faster downloads (256KB)
+            done = 0
+            try:
+                async for chunk in resp.content.iter_chunked(262144):
+                    await writer.write(chunk)
+                    done += len(chunk)
+                    await _report(done)
+            finally:
+                await writer.close()
+
+
+@asynccontextmanager
+async def open_url(url: str, filename: str | None = None, max_size: int | None = None):
+    """
+    GET a direct URL for streaming. Yields (filename, total, chunks): the
+    name from the URL (or `filename`), the Content-Length (0 if unknown)
+    and an async iterator over the body in 256 KB chunks, valid inside the
+    block. The iterator raises DownloadTooLarge once it passes `max_size`.
+    """
+    filename = filename or url_filename(url)
+
+    timeout = aiohttp.ClientTimeout(total=None, connect=30)
+
+    session = http_session()
+    async with session.get(url, timeout=timeout) as resp:
+        resp.raise_for_status()
+        total = int(resp.headers.get("Content-Length", 0))
+
+        async def _chunks():
+            done = 0
+            async for chunk in resp.content.iter_chunked(262144):
+                done += len(chunk)
+                if max_size and done > max_size:
+                    raise DownloadTooLarge(done, max_size)
+                yield chunk
+
+        yield filename, total, _chunks()
 
 
 # ──────────────────────────────────────────────────────────────────────────────